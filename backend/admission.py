@@ -0,0 +1,60 @@
+import threading
+
+
+class AdmissionController:
+    # caps in-flight upstream calls per process with a short bounded wait queue
+    # anything past the queue is rejected straight away instead of tying up a worker thread
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.draining = False
+
+    def acquire(self):
+        # returns None once a slot is held, otherwise (status, reason) to send back
+        with self.lock:
+            if self.draining:
+                self.rejected += 1
+                return 503, 'Server is shutting down'
+            if self.slots.acquire(blocking=False):
+                self.in_flight += 1
+                return None
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return 429, 'Too many requests in flight'
+            self.waiting += 1
+
+        acquired = self.slots.acquire(timeout=self.queue_timeout)
+        with self.lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+                return None
+            self.rejected += 1
+        return 503, 'Timed out waiting for capacity'
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def drain(self):
+        # stop admitting new work, requests already admitted (including streams) run to completion
+        with self.lock:
+            self.draining = True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'draining': self.draining,
+            }
@@ -0,0 +1,111 @@
+# benchmark for recommender.py on a synthetic catalogue, no database needed
+#
+#   cd backend
+#   python bench_recommender.py --users 100000 --movies 100000
+import os
+import time
+import argparse
+import resource
+import tempfile
+import numpy as np
+from search_index import write_arrays
+from recommender import MAGIC, RecommendationService, build_arrays, open_model
+
+
+def synthetic_data(n_users, n_movies, per_user, n_genres, n_actors, seed):
+    # zipf-ish popularity so a few movies are watched by many users, like the real thing
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, n_movies + 1) ** 0.8
+    popularity /= popularity.sum()
+    movie_ids = np.arange(1, n_movies + 1)
+
+    user_items = {}
+    counts = rng.poisson(per_user, n_users).clip(1, n_movies)
+    for user in range(n_users):
+        picks = rng.choice(movie_ids, size=counts[user], replace=False, p=popularity)
+        user_items[f"user-{user}"] = {int(m): 1.0 for m in picks}
+
+    genre_links = [(int(m), int(g)) for m in movie_ids for g in rng.choice(n_genres, size=rng.integers(1, 4), replace=False)]
+    actor_links = [(int(m), int(a)) for m in movie_ids for a in rng.choice(n_actors, size=10, replace=False)]
+    movies = {
+        int(m): {"movie_id": int(m), "title": f"Movie {m}", "poster_path": f"/{m}.jpg",
+                 "popularity": float(p), "release_date": "2001-01-01"}
+        for m, p in zip(movie_ids, popularity * 1e6)
+    }
+    return user_items, movie_ids.tolist(), genre_links, actor_links, movies
+
+
+def percentile_ms(samples, p):
+    return np.percentile(samples, p) * 1000
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the item-item recommender")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--per-user", type=int, default=30, help="mean watched/playlisted movies per user")
+    parser.add_argument("--genres", type=int, default=19)
+    parser.add_argument("--actors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    user_items, movie_ids, genre_links, actor_links, movies = synthetic_data(
+        args.users, args.movies, args.per_user, args.genres, args.actors, args.seed
+    )
+    print(f"generated {args.users} users x {args.movies} movies in {time.perf_counter() - started:.1f}s")
+    print(f"peak RSS after generating: {peak_rss_mib():.0f} MiB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "recommendations.bin")
+        started = time.perf_counter()
+        arrays, meta = build_arrays(user_items, movie_ids, genre_links, actor_links, movies)
+        write_arrays(path, arrays, meta, MAGIC)
+        print(
+            f"built model in {time.perf_counter() - started:.1f}s ({len(arrays['neighbor_values'])} neighbour entries, "
+            f"{os.path.getsize(path) / 2 ** 20:.0f} MiB file), peak RSS {peak_rss_mib():.0f} MiB"
+        )
+
+        del arrays  # so freeing the build isn't timed as part of the open
+        started = time.perf_counter()
+        model = open_model(path)
+        print(f"opened model in {(time.perf_counter() - started) * 1000:.1f}ms")
+        query(model, args)
+
+
+def query(model, args):
+    rng = np.random.default_rng(args.seed + 1)
+    users = [f"user-{u}" for u in rng.integers(0, args.users, args.queries)]
+    samples = []
+    for user_id in users:
+        started = time.perf_counter()
+        model.recommend(user_id, n=8)
+        samples.append(time.perf_counter() - started)
+    print(f"recommend: p50 {percentile_ms(samples, 50):.2f}ms  p99 {percentile_ms(samples, 99):.2f}ms")
+
+    # what GET /api/recommendations does: score, then look up the fields of each result
+    service = RecommendationService()
+    samples = []
+    for user_id in users:
+        started = time.perf_counter()
+        service.movie_payload(model, model.recommend(user_id, n=8))
+        samples.append(time.perf_counter() - started)
+    print(f"recommend + payload: p50 {percentile_ms(samples, 50):.2f}ms  p99 {percentile_ms(samples, 99):.2f}ms")
+
+    samples = []
+    for user_id, movie_id in zip(users, rng.integers(1, args.movies + 1, args.queries)):
+        started = time.perf_counter()
+        model.add_interaction(user_id, int(movie_id))
+        model.recommend(user_id, n=8)
+        samples.append(time.perf_counter() - started)
+    print(f"watch + recommend: p50 {percentile_ms(samples, 50):.2f}ms  p99 {percentile_ms(samples, 99):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmark for search_index.py on a synthetic catalogue, no database needed
+#
+#   cd backend
+#   python bench_search.py --titles 500000
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from search_index import (
+    SearchIndex, open_index, write_arrays, append_updates, replay_log, compact, log_path, movie_doc, person_doc
+)
+
+GENRES = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37]
+CONSONANTS = ["b", "c", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w", "z", "ch", "sh", "th", "st"]
+VOWELS = ["a", "e", "i", "o", "u", "y", "ea", "ou", "ie"]
+SYLLABLES = [c + v for c in CONSONANTS for v in VOWELS] + [c + v + e for c in CONSONANTS for v in VOWELS for e in "nrstl"]
+STOPWORDS = ["the", "of", "a", "and", "in", "to", "return", "night", "last", "love", "war", "man", "city"]
+
+
+def synthetic_words(rng, n):
+    # made-up words with a zipf-ish frequency, so some are common and most are rare
+    words = ["".join(rng.choice(SYLLABLES, size=rng.integers(1, 4))) for _ in range(n)]
+    weights = 1.0 / np.arange(1, n + 1) ** 0.9
+    return words, weights / weights.sum()
+
+
+def synthetic_corpus(n_titles, n_people, seed):
+    rng = np.random.default_rng(seed)
+    words, weights = synthetic_words(rng, 60000)
+    picks = iter(rng.choice(len(words), size=n_titles * 12 + n_people * 2, p=weights).tolist())
+    title_words = rng.integers(1, 5, n_titles).tolist()
+    stopwords = np.where(rng.random(n_titles) < 0.3, rng.integers(0, len(STOPWORDS), n_titles), -1).tolist()
+    tagline_words = np.where(rng.random(n_titles) < 0.5, rng.integers(3, 8, n_titles), 0).tolist()
+    years = rng.integers(1920, 2026, n_titles).tolist()
+    ratings = rng.uniform(1, 10, n_titles).round(1).tolist()
+    popularity = rng.pareto(1.5, n_titles).tolist()
+    genre_counts = rng.integers(1, 4, n_titles).tolist()
+    genres = np.array(GENRES)[np.argsort(rng.random((n_titles, len(GENRES))), axis=1)[:, :3]].tolist()
+
+    movies, people = [], []
+    for i in range(n_titles):
+        title = [words[next(picks)] for _ in range(title_words[i])]
+        if stopwords[i] >= 0:
+            title.insert(0, STOPWORDS[stopwords[i]])
+        movie = {
+            "movie_id": i + 1,
+            "title": " ".join(title).title(),
+            "tagline": " ".join(words[next(picks)] for _ in range(tagline_words[i])) or None,
+            "release_date": f"{years[i]}-01-01",
+            "vote_avg": ratings[i],
+            "popularity": popularity[i],
+        }
+        movies.append(movie_doc(movie, genres[i][:genre_counts[i]]))
+    for member_id, pop in enumerate(rng.pareto(2, n_people).tolist(), start=1):
+        name = f"{words[next(picks)].title()} {words[next(picks)].title()}"
+        people.append(person_doc({"member_id": member_id, "name": name, "popularity": pop}))
+    return movies, people
+
+
+def typo(rng, text):
+    # one random substitution, deletion or transposition
+    i = int(rng.integers(0, max(len(text) - 1, 1)))
+    kind = rng.integers(3)
+    if kind == 0:
+        return text[:i] + "xqz"[rng.integers(3)] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + text[i + 1:]
+    return text[:i] + text[i + 1:i + 2] + text[i:i + 1] + text[i + 2:]
+
+
+def timed(samples, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+def report(label, samples):
+    p50, p99 = np.percentile(samples, [50, 99]) * 1000
+    print(f"{label}: p50 {p50:.2f}ms  p99 {p99:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search index")
+    parser.add_argument("--titles", type=int, default=500000)
+    parser.add_argument("--people", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    movies, people = synthetic_corpus(args.titles, args.people, args.seed)
+    print(f"generated {len(movies)} titles and {len(people)} people in {time.perf_counter() - started:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search_index.bin")
+        started = time.perf_counter()
+        index = SearchIndex()
+        index.upsert(movies)
+        index.upsert(people)
+        arrays, meta = index.merged_arrays()
+        write_arrays(path, arrays, meta)
+        print(f"built index in {time.perf_counter() - started:.1f}s ({os.path.getsize(path) / 2 ** 20:.0f} MiB)")
+
+        del index, arrays  # so freeing the build isn't timed as part of the open
+        started = time.perf_counter()
+        index, _ = open_index(path)
+        print(f"opened index in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        rng = np.random.default_rng(args.seed + 1)
+        targets = [movies[i] for i in rng.integers(0, len(movies), args.queries)]
+        samples, found = [], 0
+        for movie in targets:
+            results = timed(samples, index.search, typo(rng, movie["name"]), kind=0, limit=20)
+            found += any(key >> 1 == movie["id"] for key, _ in results)
+        report("search with one typo", samples)
+        print(f"  target in top 20: {found / len(targets):.1%}")
+
+        samples = []
+        for movie in targets:
+            timed(samples, index.search, movie["name"], kind=0, genres=movie["genres"][:1],
+                  year=int(movie["release_date"][:4]), min_rating=5, limit=20)
+        report("search with genre/year/rating facets", samples)
+
+        samples = []
+        for movie in targets:
+            word = movie["name"].split()[-1]
+            timed(samples, index.complete, word[:rng.integers(2, len(word) + 1)], limit=10)
+        report("prefix autocomplete", samples)
+
+        # updates land in the log, a reader picks them up without reopening the file
+        updated = [dict(movie, name=movie["name"] + " Returns") for movie in targets[:200]]
+        append_updates(path, updated)
+        samples = []
+        started = time.perf_counter()
+        replay_log(index, log_path(path), 0)
+        print(f"applied {len(updated)} logged updates in {(time.perf_counter() - started) * 1000:.1f}ms")
+        for movie in updated:
+            timed(samples, index.search, movie["name"], limit=20)
+        report("search with an update log", samples)
+
+        started = time.perf_counter()
+        compact(path)
+        print(f"compacted in {time.perf_counter() - started:.1f}s, log now {os.path.getsize(log_path(path))} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def cache_key(model, messages):
+    # role + whitespace-normalised content, so retries and double-submits hash the same
+    normalized = [
+        {'role': m.get('role'), 'content': ' '.join(str(m.get('content') or '').split())}
+        for m in messages or []
+    ]
+    raw = json.dumps({'model': model, 'messages': normalized}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    # in-memory LRU with a per-entry TTL
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskCache:
+    # sqlite-backed cache, survives restarts and is shared by every worker process
+    def __init__(self, path, ttl, table='chat_cache'):
+        self.ttl = ttl
+        self.table = table
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, expires REAL)')
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(f'SELECT value, expires FROM {self.table} WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)',
+                (key, json.dumps(value), now + self.ttl)
+            )
+            self.conn.execute(f'DELETE FROM {self.table} WHERE expires < ?', (now,))
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+
+class InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StreamedCompletion:
+    # rebuilds a chat completion from the SSE lines of a streamed reply
+    def __init__(self):
+        self.id = None
+        self.model = None
+        self.role = 'assistant'
+        self.parts = []
+        self.finish_reason = None
+        self.done = False
+
+    def add(self, line):
+        if not line.startswith('data:'):
+            return
+        data = line[5:].strip()
+        if data == '[DONE]':
+            self.done = True
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            return
+        self.id = chunk.get('id', self.id)
+        self.model = chunk.get('model', self.model)
+        for choice in chunk.get('choices') or []:
+            delta = choice.get('delta') or {}
+            self.role = delta.get('role') or self.role
+            if delta.get('content'):
+                self.parts.append(delta['content'])
+            self.finish_reason = choice.get('finish_reason') or self.finish_reason
+
+    def completion(self):
+        # None until the stream has ended with [DONE]
+        if not self.done:
+            return None
+        return {
+            'id': self.id,
+            'object': 'chat.completion',
+            'model': self.model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': self.role, 'content': ''.join(self.parts)},
+                'finish_reason': self.finish_reason or 'stop'
+            }]
+        }
+
+
+class ChatCache:
+    # memory first, then the optional disk tier; identical misses in flight share one upstream call
+    def __init__(self, memory, disk=None, wait_timeout=None):
+        self.memory = memory
+        self.disk = disk
+        self.wait_timeout = wait_timeout
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        if value is not None:
+            with self.lock:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        # returns (value, 'hit' | 'miss' | 'coalesced'), errors from compute reach every waiter
+        value = self.get(key)
+        if value is not None:
+            return value, 'hit'
+
+        call, leader = self.join(key)
+        if not leader:
+            return self.wait(call), 'coalesced'
+        try:
+            value = compute()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, value)
+        return value, 'miss'
+
+    def join(self, key):
+        # returns (call, leader), the leader computes the value and calls finish, everyone else waits
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        return call, leader
+
+    def wait(self, call):
+        if not call.event.wait(self.wait_timeout):
+            raise TimeoutError('Timed out waiting for an identical request')
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def finish(self, key, call, value=None, error=None):
+        # safe to call more than once, only the first result counts
+        with self.lock:
+            if call.event.is_set():
+                return
+            if self.in_flight.get(key) is call:
+                del self.in_flight[key]
+            call.value, call.error = value, error
+        if error is None:
+            self.set(key, value)
+        call.event.set()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                'entries': len(self.memory),
+                'max_entries': self.memory.max_entries,
+                'ttl': self.memory.ttl,
+                'disk': self.disk is not None,
+            }
@@ -1,36 +1,354 @@
 import os
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
+from admission import AdmissionController
+from chat_cache import ChatCache, DiskCache, LRUCache, StreamedCompletion, cache_key
+from user_context import (
+    build_context_prompt, get_supabase, get_user_context, invalidate_user_context, trim_messages,
+    user_id_from_token, with_user_context
+)
+from recommender import RecommendationService
+from home_rails import HomeRails
+from search_index import KINDS, LiveSearchIndex
 
 app = Flask(__name__)
 CORS(app)
 
-GROQ_API_URL = 'https://api.groq.com/openai/v1/chat/completions'
+GROQ_API_URL = os.environ.get("GROQ_API_URL", 'https://api.groq.com/openai/v1/chat/completions')
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+GROQ_CONNECT_TIMEOUT = float(os.environ.get("GROQ_CONNECT_TIMEOUT", "5"))
+GROQ_READ_TIMEOUT = float(os.environ.get("GROQ_READ_TIMEOUT", "60"))  # max gap between bytes, not total time
+GROQ_POOL_SIZE = int(os.environ.get("GROQ_POOL_SIZE", "20"))
+DEFAULT_MODEL = 'llama3-8b-8192'
+
+# per-process backpressure, see gunicorn.conf.py for how these relate to worker threads
+PROXY_MAX_IN_FLIGHT = int(os.environ.get("PROXY_MAX_IN_FLIGHT", "16"))
+PROXY_MAX_QUEUE = int(os.environ.get("PROXY_MAX_QUEUE", "16"))
+PROXY_QUEUE_TIMEOUT = float(os.environ.get("PROXY_QUEUE_TIMEOUT", "2"))
+
+RAILS_REBUILD_TOKEN = os.environ.get("RAILS_REBUILD_TOKEN")  # shared secret for POST /api/home/rebuild
+
+CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", "1024"))  # entries kept in memory
+CHAT_CACHE_TTL = float(os.environ.get("CHAT_CACHE_TTL", "600"))  # seconds
+CHAT_CACHE_PATH = os.environ.get("CHAT_CACHE_PATH")  # optional sqlite file for the on-disk tier
+
+# shared keep-alive pool, so each message doesn't pay for a new TLS handshake
+upstream = requests.Session()
+adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GROQ_POOL_SIZE)
+upstream.mount('https://', adapter)
+upstream.mount('http://', adapter)
+
+admission = AdmissionController(PROXY_MAX_IN_FLIGHT, PROXY_MAX_QUEUE, PROXY_QUEUE_TIMEOUT)
+recommendations = RecommendationService()
+home_rails = HomeRails(get_supabase)
+search_index = LiveSearchIndex()
+chat_cache = ChatCache(
+    LRUCache(CHAT_CACHE_SIZE, CHAT_CACHE_TTL),
+    DiskCache(CHAT_CACHE_PATH, CHAT_CACHE_TTL) if CHAT_CACHE_PATH else None,
+    wait_timeout=GROQ_CONNECT_TIMEOUT + GROQ_READ_TIMEOUT
+)
+
+
+def sse_event(data):
+    return f"data: {data}\n\n"
+
+
+def relay_stream(response, key, call):
+    # forward upstream SSE events as they arrive, chunk_size=None yields bytes without buffering
+    # the deltas are collected so the finished reply is cached and handed to identical requests waiting on it
+    collected = StreamedCompletion()
+    error = None
+    try:
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if line:
+                collected.add(line)
+                yield f"{line}\n\n"
+    except requests.RequestException as e:
+        error = e
+        yield sse_event(json.dumps({'error': str(e)}))
+    finally:
+        response.close()
+        completion = collected.completion()
+        if completion is not None:
+            chat_cache.finish(key, call, completion)
+        else:
+            chat_cache.finish(key, call, error=error or StreamEndedEarly('Upstream stream ended before [DONE]'))
+
+
+class StreamEndedEarly(requests.RequestException):
+    pass
+
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    return jsonify(admission.stats())
+
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    return header[7:] if header.startswith('Bearer ') else None
+
+
+def current_user_id():
+    token = bearer_token()
+    return user_id_from_token(token) if token else None
+
+
+@app.route('/api/context', methods=['GET'])
+def user_context():
+    user_id = current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Not signed in'}), 401
+    context = get_user_context(user_id)
+    return jsonify({'context': context, 'prompt': build_context_prompt(context)})
+
+
+@app.route('/api/context/invalidate', methods=['POST'])
+def invalidate_context():
+    # called after the user watches a movie or edits playlists
+    user_id = current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Not signed in'}), 401
+    invalidate_user_context(user_id)
+    return jsonify({'ok': True})
+
+
+@app.route('/api/recommendations', methods=['GET'])
+def personal_recommendations():
+    user_id = current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Not signed in'}), 401
+    model = recommendations.current()
+    if model is None:
+        return jsonify({'error': 'Recommendations are not available yet'}), 503
+    n = request.args.get('n', 8, type=int)
+    return jsonify(recommendations.movie_payload(model, model.recommend(user_id, n)))
+
+
+@app.route('/api/recommendations/friend/<friend_id>', methods=['GET'])
+def friend_recommendations(friend_id):
+    # movies from the friend's history that fit the signed-in user's taste
+    user_id = current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Not signed in'}), 401
+    model = recommendations.current()
+    if model is None:
+        return jsonify({'error': 'Recommendations are not available yet'}), 503
+    n = request.args.get('n', 6, type=int)
+    candidates = model.user_movie_ids(friend_id)
+    return jsonify(recommendations.movie_payload(model, model.recommend(user_id, n, candidates)))
+
+
+@app.route('/api/recommendations/watched', methods=['POST'])
+def record_watched():
+    user_id = current_user_id()
+    if not user_id:
+        return jsonify({'error': 'Not signed in'}), 401
+    movie_id = (request.get_json() or {}).get('movie_id')
+    if movie_id is None:
+        return jsonify({'error': 'movie_id is required'}), 400
+    model = recommendations.current()
+    applied = model is not None and model.add_interaction(user_id, int(movie_id))
+    return jsonify({'ok': True, 'applied': applied})
+
+
+@app.route('/api/home', methods=['GET'])
+def home():
+    # every home page rail in one cacheable document
+    body, etag = home_rails.current()
+    if body is None:
+        return jsonify({'error': 'Home rails are not available yet'}), 503
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=60'}
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+@app.route('/api/home/rebuild', methods=['POST'])
+def rebuild_home():
+    # called by the importer once a run has finished
+    if not RAILS_REBUILD_TOKEN or bearer_token() != RAILS_REBUILD_TOKEN:
+        return jsonify({'error': 'Not allowed'}), 403
+    return jsonify({'etag': home_rails.rebuild()})
+
+
+def search_args():
+    # shared query parameters of the search endpoints, raises ValueError on bad input
+    kind = request.args.get('kind')
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    return KINDS.get(kind), limit
+
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    # typo-tolerant search over titles, taglines and people, with facets applied inside the index
+    index = search_index.current()
+    if index is None:
+        return jsonify({'error': 'Search index is not available yet'}), 503
+    try:
+        kind, limit = search_args()
+        genres = [int(g) for g in request.args.get('genres', '').split(',') if g.strip()]
+        year = int(request.args['year']) if request.args.get('year') else None
+        min_rating = float(request.args['min_rating']) if request.args.get('min_rating') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results = index.search(request.args.get('q', ''), kind, genres or None, year, min_rating, limit)
+    return jsonify([{**index.lookup(key), 'score': round(score, 4)} for key, score in results])
+
+
+@app.route('/api/search/complete', methods=['GET'])
+def complete():
+    index = search_index.current()
+    if index is None:
+        return jsonify({'error': 'Search index is not available yet'}), 503
+    try:
+        kind, limit = search_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify([index.lookup(key) for key, _ in index.complete(request.args.get('q', ''), kind, min(limit, 20))])
+
+
+@app.route('/api/chat/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(chat_cache.stats())
+
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     if not GROQ_API_KEY:
         return jsonify({'error': 'GROQ_API_KEY not set in environment'}), 500
     data = request.get_json()
-    messages = data.get('messages')
-    model = data.get('model', 'llama3-8b-8192')
-    payload = {
-        'model': model,
-        'messages': messages,
-        'stream': False
+    messages = data.get('messages') or []
+    if not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages):
+        return jsonify({'error': 'messages must be a list of objects'}), 400
+    # building the user context costs Supabase calls, so it waits for a slot like upstream calls do
+    # plain cache hits never touch upstream or Supabase and skip admission control
+    holding = bool(data.get('with_context'))
+    if holding:
+        rejection = admission.acquire()
+        if rejection:
+            return admission_rejected(rejection)
+    try:
+        if holding:
+            messages = with_user_context(messages, bearer_token())
+        data['messages'] = trim_messages(messages)
+        cached = chat_cache.get(cache_key(data.get('model', DEFAULT_MODEL), data['messages']))
+    except Exception:
+        if holding:
+            admission.release()
+        raise
+    if cached is not None:
+        if holding:
+            admission.release()
+        return cached_response(cached, bool(data.get('stream', False)))
+    if not holding:
+        rejection = admission.acquire()
+        if rejection:
+            return admission_rejected(rejection)
+    try:
+        response = app.make_response(forward_chat(data))
+    except Exception:
+        admission.release()
+        raise
+    # the slot is held until the body is fully sent, so streams count against the limit
+    response.call_on_close(admission.release)
+    return response
+
+
+def admission_rejected(rejection):
+    status, reason = rejection
+    return jsonify({'error': reason}), status, {'Retry-After': '1'}
+
+
+def cached_response(completion, stream, source='hit'):
+    if not stream:
+        return jsonify(completion), 200, {'X-Cache': source}
+    return Response(
+        replay_completion(completion),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Cache': source}
+    )
+
+
+def replay_completion(completion):
+    # a cached completion sent as a single streamed chunk
+    message = completion['choices'][0]['message']
+    chunk = {
+        'id': completion.get('id'),
+        'object': 'chat.completion.chunk',
+        'model': completion.get('model'),
+        'choices': [{'index': 0, 'delta': {'role': message.get('role'), 'content': message.get('content')}, 'finish_reason': 'stop'}]
     }
+    yield sse_event(json.dumps(chunk))
+    yield sse_event('[DONE]')
+
+
+def post_upstream(payload, stream):
     headers = {
         'Authorization': f'Bearer {GROQ_API_KEY}',
         'Content-Type': 'application/json'
     }
+    response = upstream.post(
+        GROQ_API_URL,
+        json=payload,
+        headers=headers,
+        timeout=(GROQ_CONNECT_TIMEOUT, GROQ_READ_TIMEOUT),
+        stream=stream
+    )
+    response.raise_for_status()
+    return response
+
+
+def fetch_completion(payload):
+    return post_upstream(payload, stream=False).json()
+
+
+def forward_chat(data):
+    messages = data.get('messages')
+    model = data.get('model', DEFAULT_MODEL)
+    stream = bool(data.get('stream', False))
+    payload = {
+        'model': model,
+        'messages': messages,
+        'stream': stream
+    }
+    key = cache_key(model, messages)
     try:
-        response = requests.post(GROQ_API_URL, json=payload, headers=headers)
-        response.raise_for_status()
-        return jsonify(response.json())
+        if stream:
+            # identical requests already in flight, streamed or not, wait for this one and get a replay
+            call, leader = chat_cache.join(key)
+            if not leader:
+                return cached_response(chat_cache.wait(call), True, 'coalesced')
+            try:
+                upstream_response = post_upstream(payload, stream=True)
+            except Exception as e:
+                chat_cache.finish(key, call, error=e)
+                raise
+            response = Response(
+                stream_with_context(relay_stream(upstream_response, key, call)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Cache': 'miss'}
+            )
+            # a stream that is never iterated must still release its waiters
+            response.call_on_close(lambda: chat_cache.finish(key, call, error=StreamEndedEarly('Stream closed before [DONE]')))
+            return response
+        # identical requests already in flight wait for this one instead of going upstream
+        completion, source = chat_cache.get_or_compute(key, lambda: fetch_completion(payload))
+        return jsonify(completion), 200, {'X-Cache': source}
+    except (requests.Timeout, TimeoutError) as e:
+        return jsonify({'error': 'Upstream timed out', 'details': str(e)}), 504
     except requests.RequestException as e:
-        return jsonify({'error': str(e), 'details': getattr(e.response, 'text', None)}), 500
+        details = getattr(e.response, 'text', None)
+        if e.response is not None:
+            e.response.close()
+        return jsonify({'error': str(e), 'details': details}), 500
+    except ValueError as e:
+        return jsonify({'error': 'Invalid upstream response', 'details': str(e)}), 502
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5003, debug=True)
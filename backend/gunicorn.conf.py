@@ -0,0 +1,38 @@
+# production entry point for the chat proxy:
+#   cd backend
+#   gunicorn -c gunicorn.conf.py groqProxy:app
+import os
+import signal
+import multiprocessing
+
+bind = os.environ.get("PROXY_BIND", "0.0.0.0:5003")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# upstream calls are I/O bound, so each worker runs a thread per admitted request plus
+# the queue, with a few spare threads to answer 429/503 and health checks immediately
+worker_class = "gthread"
+threads = (
+    int(os.environ.get("PROXY_MAX_IN_FLIGHT", "16"))
+    + int(os.environ.get("PROXY_MAX_QUEUE", "16"))
+    + 4
+)
+
+# streamed replies can be long, keep the worker alive for as long as upstream may go quiet
+timeout = int(float(os.environ.get("GROQ_READ_TIMEOUT", "60"))) + 30
+# on SIGTERM, in-flight requests and streams get this long to finish
+graceful_timeout = int(os.environ.get("PROXY_GRACEFUL_TIMEOUT", "120"))
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # reject new work with 503 as soon as shutdown starts, then let gunicorn drain the rest
+    from groqProxy import admission
+
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        admission.drain()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
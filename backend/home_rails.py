@@ -0,0 +1,140 @@
+# materializes every home page rail into one JSON document
+#
+#   cd backend
+#   python home_rails.py      rebuild the document, e.g. from cron after an import
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+RAILS_PATH = os.environ.get("RAILS_PATH", "home_rails.json")
+RAILS_MAX_AGE = float(os.environ.get("RAILS_MAX_AGE", "3600"))  # seconds before the endpoint rebuilds in the background
+RAILS_SIZE = 20
+RAILS_GENRES = {"animated": 16, "horror": 27}
+
+RAIL_COLUMNS = (
+    "movie_id, title, synopsis, tagline, poster_path, backdrop_path, vote_avg, "
+    "popularity, release_date, runtime, rating, trailer_key"
+)
+
+
+def hero_rail(client):
+    # backdrops come from the importer, no per-movie TMDB calls on page load
+    return client.table("movie").select(RAIL_COLUMNS).not_.is_("backdrop_path", "null") \
+        .order("popularity", desc=True).order("vote_avg", desc=True).limit(RAILS_SIZE).execute().data
+
+
+def now_playing_rail(client):
+    today = date.today()
+    return client.table("movie").select(RAIL_COLUMNS) \
+        .gte("release_date", (today - timedelta(days=60)).isoformat()).lte("release_date", today.isoformat()) \
+        .order("release_date", desc=True).order("popularity", desc=True).limit(RAILS_SIZE).execute().data
+
+
+def upcoming_rail(client):
+    return client.table("movie").select(RAIL_COLUMNS).gt("release_date", date.today().isoformat()) \
+        .order("popularity", desc=True).order("release_date").limit(RAILS_SIZE).execute().data
+
+
+def popular_rail(client):
+    return client.table("movie").select(RAIL_COLUMNS) \
+        .order("popularity", desc=True).limit(RAILS_SIZE).execute().data
+
+
+def genre_rail(client, genre_id):
+    # sorted and limited by the database instead of pulling 50 joined rows to sort in the browser
+    rows = client.table("movie").select(f"{RAIL_COLUMNS}, movie_genre!inner(genre_id)") \
+        .eq("movie_genre.genre_id", genre_id).order("popularity", desc=True).limit(RAILS_SIZE).execute().data
+    for row in rows:
+        row.pop("movie_genre", None)
+    return rows
+
+
+def build_home_rails(client):
+    rails = {
+        "hero": hero_rail,
+        "now_playing": now_playing_rail,
+        "upcoming": upcoming_rail,
+        "popular": popular_rail,
+    }
+    with ThreadPoolExecutor(max_workers=len(rails) + len(RAILS_GENRES)) as executor:
+        futures = {name: executor.submit(build, client) for name, build in rails.items()}
+        genre_futures = {name: executor.submit(genre_rail, client, genre_id) for name, genre_id in RAILS_GENRES.items()}
+        document = {name: future.result() for name, future in futures.items()}
+        document["genres"] = {name: future.result() for name, future in genre_futures.items()}
+    document["generated_at"] = datetime.now(timezone.utc).isoformat()
+    return document
+
+
+def write_document(document, path=RAILS_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(document, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+class HomeRails:
+    # serves the rails document with a strong ETag, reloading when the file changes on disk
+    def __init__(self, get_client, path=RAILS_PATH):
+        self.get_client = get_client
+        self.path = path
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()  # one build at a time, the queries run without self.lock
+        self.body = None
+        self.etag = None
+        self.mtime = None
+        self.last_attempt = None
+        self.rebuilding = False
+
+    def current(self):
+        # returns (body bytes, etag), or (None, None) if no document has been built yet
+        with self.lock:
+            mtime = self.file_mtime()
+            stale = mtime is None or time.time() - mtime > RAILS_MAX_AGE
+            # the last document is served while a background thread rebuilds,
+            # a failing database is retried at most once a minute
+            if stale and not self.rebuilding and (self.last_attempt is None or time.monotonic() - self.last_attempt > 60):
+                self.rebuilding = True
+                self.last_attempt = time.monotonic()
+                threading.Thread(target=self.rebuild_in_background, daemon=True).start()
+            self.load_locked()
+            return self.body, self.etag
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            with self.lock:
+                self.rebuilding = False
+
+    def rebuild(self):
+        with self.rebuild_lock:
+            try:
+                write_document(build_home_rails(self.get_client()), self.path)
+            except Exception as e:
+                logging.error(f"Rebuilding home rails failed ({e})")
+        with self.lock:
+            self.load_locked()
+            return self.etag
+
+    def load_locked(self):
+        mtime = self.file_mtime()
+        if mtime is None or mtime == self.mtime:
+            return
+        with open(self.path, "rb") as f:
+            self.body = f.read()
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.mtime = mtime
+
+    def file_mtime(self):
+        return os.path.getmtime(self.path) if os.path.exists(self.path) else None
+
+
+if __name__ == "__main__":
+    from user_context import get_supabase
+    write_document(build_home_rails(get_supabase()))
+    print(f"Wrote {RAILS_PATH}")
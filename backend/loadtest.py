@@ -0,0 +1,171 @@
+# load test for the chat proxy against a local stub LLM, no network access needed
+#
+#   cd backend
+#   python loadtest.py --requests 500 --concurrency 64 --stream
+#
+# by default this starts the stub and the production entry point (gunicorn -c gunicorn.conf.py)
+# pointed at it; pass --proxy-url to measure an already running proxy instead
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_stub_handler(first_token_delay, token_delay, tokens):
+    class StubLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(first_token_delay)
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(tokens):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": f"tok{i} "}}]}
+                    self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                    time.sleep(token_delay)
+                self.write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                time.sleep(token_delay * tokens)
+                content = " ".join(f"tok{i}" for i in range(tokens))
+                payload = json.dumps({
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        def write_chunk(self, text):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return StubLLMHandler
+
+
+def start_stub(port, first_token_delay, token_delay, tokens):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_stub_handler(first_token_delay, token_delay, tokens))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_proxy(stub_url, port):
+    env = dict(os.environ, GROQ_API_URL=stub_url, GROQ_API_KEY="loadtest", PROXY_BIND=f"127.0.0.1:{port}")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "groqProxy:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    proxy_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return proc, proxy_url
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("proxy did not come up")
+
+
+def one_request(proxy_url, stream, prompt):
+    # returns (status, time to first byte, total time)
+    url = urlparse(proxy_url)
+    body = json.dumps({"messages": [{"role": "user", "content": prompt}], "stream": stream})
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=120)
+    try:
+        conn.request("POST", "/api/chat", body=body, headers={"Content-Type": "application/json"})
+        res = conn.getresponse()
+        first = res.read(1)
+        ttfb = time.perf_counter() - start
+        if first:
+            res.read()
+        return res.status, ttfb, time.perf_counter() - start
+    except OSError:
+        return None, None, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(proxy_url, total, concurrency, stream, repeat_prompt=False):
+    # every prompt is unique by default so the proxy's response cache can't answer it
+    prompts = ["recommend a movie" if repeat_prompt else f"recommend a movie (#{i})" for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda prompt: one_request(proxy_url, stream, prompt), prompts))
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [r for r in results if r[0] == 200]
+    latencies = [r[2] for r in ok]
+    ttfbs = [r[1] for r in ok]
+    print(f"{total} requests, concurrency {concurrency}, stream={stream}, repeat_prompt={repeat_prompt}, {elapsed:.2f}s")
+    print(f"statuses: {statuses}")
+    print(f"throughput: {len(ok) / elapsed:.1f} ok req/s")
+    print(f"latency  p50 {percentile(latencies, 50) * 1000:.0f}ms  p99 {percentile(latencies, 99) * 1000:.0f}ms")
+    print(f"ttfb     p50 {percentile(ttfbs, 50) * 1000:.0f}ms  p99 {percentile(ttfbs, 99) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat proxy against a stub LLM")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--repeat-prompt", action="store_true", help="send the same prompt every time to measure the cached path")
+    parser.add_argument("--proxy-url", help="measure a proxy that is already running (point its GROQ_API_URL at the stub)")
+    parser.add_argument("--stub-port", type=int, default=5099)
+    parser.add_argument("--proxy-port", type=int, default=5098)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    stub = start_stub(args.stub_port, args.first_token_ms / 1000, args.token_ms / 1000, args.tokens)
+    stub_url = f"http://127.0.0.1:{args.stub_port}/openai/v1/chat/completions"
+    print(f"stub LLM listening on {stub_url}")
+
+    proc = None
+    proxy_url = args.proxy_url
+    if not proxy_url:
+        proc, proxy_url = start_proxy(stub_url, args.proxy_port)
+    try:
+        run(proxy_url, args.requests, args.concurrency, args.stream, args.repeat_prompt)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
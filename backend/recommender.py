@@ -0,0 +1,361 @@
+# item-item recommender
+#
+# the similarity matrix is built offline and written to one memory-mapped file,
+# every worker opens the same file and reopens it when a new build replaces it.
+#
+#   cd backend
+#   python recommender.py --build      build from the database, e.g. hourly from cron
+import os
+import sys
+import time
+import logging
+import sqlite3
+import argparse
+import threading
+import numpy as np
+import scipy.sparse as sp
+from search_index import write_arrays, read_arrays, pack_items
+
+RECS_MODEL_PATH = os.environ.get("RECS_MODEL_PATH", "recommendations.bin")
+RECS_NEIGHBORS = int(os.environ.get("RECS_NEIGHBORS", "50"))  # similar items kept per movie
+RECS_BLOCK_CELLS = int(os.environ.get("RECS_BLOCK_CELLS", str(2 ** 24)))  # similarity scores held per block
+RECS_CONTENT_WEIGHT = float(os.environ.get("RECS_CONTENT_WEIGHT", "0.3"))  # genre/actor vs co-watch similarity
+RECS_REFRESH_SECONDS = float(os.environ.get("RECS_REFRESH_SECONDS", "10"))  # how often workers look for a new build
+RECS_RECENT_KEEP_SECONDS = float(os.environ.get("RECS_RECENT_KEEP_SECONDS", "86400"))  # recent watches kept after a build
+RECS_PAGE_SIZE = 1000
+
+WATCHED_WEIGHT = 1.0
+PLAYLIST_WEIGHT = 0.5
+
+MAGIC = b"BNGRECS1"
+MOVIE_TEXT = ("title", "poster_path", "release_date")
+
+
+def normalize_columns(matrix):
+    # scale every column to unit length so a dot product is a cosine
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    return (matrix @ sp.diags(1.0 / norms)).tocsc()
+
+
+def top_k_rows(block, k):
+    # keep the k largest entries of each dense row, returned as (rows, cols, values)
+    # the block is negated in place rather than copied
+    k = min(k, block.shape[1])
+    np.negative(block, out=block)
+    cols = np.argpartition(block, k - 1, axis=1)[:, :k]
+    rows = np.repeat(np.arange(block.shape[0]), k)
+    values = -np.take_along_axis(block, cols, axis=1).ravel()
+    keep = values > 0
+    return rows[keep], cols.ravel()[keep], values[keep]
+
+
+def item_neighbors(interactions, features, k=RECS_NEIGHBORS, block_cells=RECS_BLOCK_CELLS,
+                   content_weight=RECS_CONTENT_WEIGHT):
+    # sparse movie x movie matrix with the top-k blended cosine neighbours of each movie
+    # computed in blocks of rows so memory stays around block_cells scores whatever the catalogue size
+    n_movies = interactions.shape[1]
+    block_size = max(1, block_cells // max(n_movies, 1))
+    collab = normalize_columns(interactions.astype(np.float32))
+    content = normalize_columns(features.T.tocsr().astype(np.float32)) if features.nnz else None
+    collab_t = collab.T.tocsr()
+    content_t = content.T.tocsr() if content is not None else None
+
+    rows, cols, values = [], [], []
+    for start in range(0, n_movies, block_size):
+        stop = min(start + block_size, n_movies)
+        # weights are applied to the sparse products so each block is densified once
+        block = ((collab_t[start:stop] @ collab) * (1 - content_weight)).toarray()
+        if content_t is not None:
+            block += ((content_t[start:stop] @ content) * content_weight).toarray()
+        block[np.arange(stop - start), np.arange(start, stop)] = 0  # a movie is not its own neighbour
+        r, c, v = top_k_rows(block, k)
+        rows.append(r + start)
+        cols.append(c)
+        values.append(v)
+
+    return sp.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_movies, n_movies), dtype=np.float32
+    )
+
+
+def build_arrays(user_items, movie_ids, genre_links, actor_links, movies=None, built_at=None):
+    # everything the serving side needs, as flat arrays plus a small json meta
+    # user_items: {user_id: {movie_id: weight}}, *_links: iterables of (movie_id, feature_id)
+    # built_at is when the inputs were read, watches recorded after it are applied on top
+    movie_ids = np.array(sorted(movie_ids), dtype=np.int64)
+    movie_index = {movie_id: i for i, movie_id in enumerate(movie_ids.tolist())}
+    movies = movies or {}
+
+    user_ids, user_indptr, cols, weights = [], [0], [], []
+    for user_id, items in user_items.items():
+        items = {movie_index[m]: w for m, w in items.items() if m in movie_index}
+        user_ids.append(user_id)
+        cols.extend(items)
+        weights.extend(items.values())
+        user_indptr.append(len(cols))
+    interactions = sp.csr_matrix(
+        (np.array(weights, dtype=np.float32), np.array(cols, dtype=np.int32), np.array(user_indptr, dtype=np.int64)),
+        shape=(len(user_ids), len(movie_ids))
+    )
+
+    features = feature_matrix(movie_index, genre_links, actor_links)
+    neighbors = item_neighbors(interactions, features)
+    # neighbour indices and indptr share a dtype so scipy wraps the mapped arrays without copying
+    index_dtype = np.int32 if neighbors.nnz < 2 ** 31 else np.int64
+    arrays = {
+        "movie_ids": movie_ids,
+        "neighbor_indptr": neighbors.indptr.astype(index_dtype),
+        "neighbor_indices": neighbors.indices.astype(index_dtype),
+        "neighbor_values": neighbors.data.astype(np.float32),
+        # cold-start fallback: most interacted-with movies first
+        "popular": np.argsort(-np.asarray(interactions.sum(axis=0)).ravel(), kind="stable").astype(np.int32),
+        "user_indptr": interactions.indptr.astype(np.int64),
+        "user_cols": interactions.indices.astype(np.int32),
+        "user_weights": interactions.data.astype(np.float32),
+        "popularity": np.array([movies.get(m, {}).get("popularity") or 0 for m in movie_ids.tolist()], dtype=np.float32),
+    }
+    for column in MOVIE_TEXT:
+        arrays[f"{column}_offsets"], arrays[f"{column}_blob"] = pack_items(
+            [(movies.get(m, {}).get(column) or "").encode("utf-8") for m in movie_ids.tolist()]
+        )
+    meta = {"users": user_ids, "built_at": built_at or time.time()}
+    return arrays, meta
+
+
+def feature_matrix(movie_index, genre_links, actor_links):
+    # movie x (genre + actor) indicator matrix
+    feature_index = {}
+    rows, cols = [], []
+    for kind, links in (("genre", genre_links), ("actor", actor_links)):
+        for movie_id, feature_id in links:
+            row = movie_index.get(movie_id)
+            if row is None:
+                continue
+            rows.append(row)
+            cols.append(feature_index.setdefault((kind, feature_id), len(feature_index)))
+    return sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(movie_index), max(len(feature_index), 1))
+    )
+
+
+def recent_path(path):
+    return f"{path}.recent"
+
+
+class RecentInteractions:
+    # watches recorded since the last build, in sqlite next to the model file so every worker sees them
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS recent (user_id TEXT, movie_id INTEGER, weight REAL, at REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS recent_user ON recent (user_id, at)")
+
+    def add(self, user_id, movie_id, weight, at=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO recent (user_id, movie_id, weight, at) VALUES (?, ?, ?, ?)",
+                (user_id, movie_id, weight, at or time.time())
+            )
+
+    def for_user(self, user_id, since):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT movie_id, weight FROM recent WHERE user_id = ? AND at > ?", (user_id, since)
+            ).fetchall()
+
+    def prune(self, before):
+        with self.lock:
+            self.conn.execute("DELETE FROM recent WHERE at < ?", (before,))
+
+
+class RecommendationModel:
+    # scores users against a built model, the arrays are usually views into a memory map
+    def __init__(self, arrays, meta, recent=None):
+        self.arrays = arrays
+        self.movie_ids = arrays["movie_ids"]
+        self.built_at = meta["built_at"]
+        self.neighbors = sp.csr_matrix(
+            (arrays["neighbor_values"], arrays["neighbor_indices"], arrays["neighbor_indptr"]),
+            shape=(len(self.movie_ids), len(self.movie_ids)), copy=False
+        )
+        self.popular = arrays["popular"]
+        self.user_rows = {user_id: row for row, user_id in enumerate(meta["users"])}
+        self.recent = recent or RecentInteractions(":memory:")
+
+    def col(self, movie_id):
+        col = int(np.searchsorted(self.movie_ids, movie_id))
+        return col if col < len(self.movie_ids) and self.movie_ids[col] == movie_id else None
+
+    def add_interaction(self, user_id, movie_id, weight=WATCHED_WEIGHT, at=None):
+        # applied immediately to the user's scores in every worker, similarities catch up on the next build
+        if self.col(movie_id) is None:
+            return False
+        self.recent.add(user_id, movie_id, weight, at)
+        return True
+
+    def user_items(self, user_id):
+        items = {}
+        row = self.user_rows.get(user_id)
+        if row is not None:
+            start, stop = self.arrays["user_indptr"][row:row + 2].tolist()
+            items = dict(zip(self.arrays["user_cols"][start:stop].tolist(), self.arrays["user_weights"][start:stop].tolist()))
+        for movie_id, weight in self.recent.for_user(user_id, self.built_at):
+            col = self.col(movie_id)
+            if col is not None:
+                items[col] = max(items.get(col, 0.0), weight)
+        return items
+
+    def scores(self, items):
+        cols = np.fromiter(items.keys(), dtype=np.int64, count=len(items))
+        weights = np.fromiter(items.values(), dtype=np.float32, count=len(items))
+        return np.asarray(self.neighbors[cols].T @ weights).ravel()
+
+    def recommend(self, user_id, n=8, candidates=None):
+        # top-n movie ids for a user, optionally limited to a candidate set (e.g. a friend's movies)
+        items = self.user_items(user_id)
+        scores = self.scores(items) if items else np.zeros(len(self.movie_ids), dtype=np.float32)
+        mask = np.ones(len(self.movie_ids), dtype=bool)
+        if candidates is not None:
+            mask[:] = False
+            mask[[col for col in map(self.col, candidates) if col is not None]] = True
+        if items:
+            mask[list(items)] = False
+
+        eligible = np.flatnonzero(mask & (scores > 0))
+        if len(eligible) > n:
+            eligible = eligible[np.argpartition(-scores[eligible], n - 1)[:n]]
+        ranked = eligible[np.argsort(-scores[eligible], kind="stable")].tolist()
+
+        if len(ranked) < n:
+            # not enough signal, top up with popular movies the user hasn't seen
+            seen = set(ranked)
+            for col in self.popular.tolist():
+                if len(ranked) >= n:
+                    break
+                if mask[col] and col not in seen:
+                    ranked.append(col)
+        return [(int(self.movie_ids[col]), float(scores[col])) for col in ranked]
+
+    def user_movie_ids(self, user_id):
+        return [int(self.movie_ids[col]) for col in self.user_items(user_id)]
+
+    def movie(self, movie_id):
+        col = self.col(movie_id)
+        if col is None:
+            return {"movie_id": movie_id}
+        movie = {"movie_id": movie_id, "popularity": float(self.arrays["popularity"][col])}
+        for column in MOVIE_TEXT:
+            # slice the mapped blob, copying only this movie's bytes
+            offsets, blob = self.arrays[f"{column}_offsets"], self.arrays[f"{column}_blob"]
+            movie[column] = blob[offsets[col]:offsets[col + 1]].tobytes().decode("utf-8") or None
+        return movie
+
+
+def fetch_rows(client, table, columns, order):
+    # page through a whole table in a stable order
+    rows, start = [], 0
+    while True:
+        query = client.table(table).select(columns)
+        for column in order:
+            query = query.order(column)
+        page = query.range(start, start + RECS_PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if not page:
+            return rows
+        start += len(page)
+
+
+def build_from_database(client, path=RECS_MODEL_PATH):
+    started = time.monotonic()
+    # stamped before reading, so watches recorded while the build runs are still applied on top of it
+    built_at = time.time()
+    user_items = {}
+    for row in fetch_rows(client, "watched_movies", "user_id, movie_id", ["user_id", "movie_id"]):
+        items = user_items.setdefault(row["user_id"], {})
+        items[row["movie_id"]] = items.get(row["movie_id"], 0.0) + WATCHED_WEIGHT
+    playlist_owner = {
+        row["playlist_id"]: row["user_id"]
+        for row in fetch_rows(client, "playlists", "playlist_id, user_id", ["playlist_id"])
+    }
+    for row in fetch_rows(client, "movie_playlists", "playlist_id, movie_id", ["playlist_id", "movie_id"]):
+        user_id = playlist_owner.get(row["playlist_id"])
+        if user_id is not None:
+            items = user_items.setdefault(user_id, {})
+            items[row["movie_id"]] = items.get(row["movie_id"], 0.0) + PLAYLIST_WEIGHT
+
+    movies = {
+        row["movie_id"]: row
+        for row in fetch_rows(client, "movie", "movie_id, title, poster_path, popularity, release_date", ["movie_id"])
+    }
+    genre_links = [(r["movie_id"], r["genre_id"]) for r in fetch_rows(client, "movie_genre", "movie_id, genre_id", ["movie_id", "genre_id"])]
+    actor_links = [(r["movie_id"], r["actor_id"]) for r in fetch_rows(client, "movie_actor", "movie_id, actor_id", ["movie_id", "actor_id"])]
+
+    arrays, meta = build_arrays(user_items, movies.keys(), genre_links, actor_links, movies, built_at)
+    write_arrays(path, arrays, meta, MAGIC)
+    # workers still on the previous build need the watches since that one, it is at most a day old
+    RecentInteractions(recent_path(path)).prune(built_at - RECS_RECENT_KEEP_SECONDS)
+    logging.warning(
+        f"Recommendation model built: {len(user_items)} users, {len(movies)} movies "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return meta
+
+
+def open_model(path, recent=None):
+    return RecommendationModel(*read_arrays(path, MAGIC), recent)
+
+
+class RecommendationService:
+    # what the backend serves from: reopens the model file when a new build replaces it
+    # requests never build a model, until the first build lands there is nothing to serve
+    def __init__(self, path=RECS_MODEL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.model = None
+        self.model_stat = None
+        self.checked_at = 0.0
+        self.recent = None
+
+    def current(self):
+        # None until a model file exists
+        with self.lock:
+            if time.monotonic() - self.checked_at >= RECS_REFRESH_SECONDS:
+                self.checked_at = time.monotonic()
+                try:
+                    self.refresh_locked()
+                except Exception as e:
+                    logging.error(f"Opening the recommendation model failed ({e})")
+            return self.model
+
+    def refresh_locked(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        model_stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if model_stat == self.model_stat:
+            return
+        if self.recent is None:
+            self.recent = RecentInteractions(recent_path(self.path))
+        self.model, self.model_stat = open_model(self.path, self.recent), model_stat
+
+    def movie_payload(self, model, recommendations):
+        return [{**model.movie(movie_id), "score": score} for movie_id, score in recommendations]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the recommendation model")
+    parser.add_argument("--build", action="store_true", help="rebuild from the database")
+    parser.add_argument("--path", default=RECS_MODEL_PATH)
+    args = parser.parse_args()
+    if args.build:
+        from user_context import get_supabase
+        meta = build_from_database(get_supabase(), args.path)
+        print(f"Built recommendations for {len(meta['users'])} users into {args.path}")
+    else:
+        parser.print_help()
+        sys.exit(1)
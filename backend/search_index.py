@@ -0,0 +1,630 @@
+# typo-tolerant search over movie titles, taglines and people's names
+#
+# the index is one file of numpy arrays that is memory-mapped on open, plus an
+# append-only log of updates written by the importer (see update_search_index in
+# data/imports.py). readers replay the log on top of the mapped base; compact()
+# folds the log into a new base file.
+#
+#   cd backend
+#   python search_index.py --build      build from the database
+#   python search_index.py --compact    fold the update log into the index file
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import unicodedata
+import numpy as np
+
+SEARCH_INDEX_PATH = os.environ.get("SEARCH_INDEX_PATH", "search_index.bin")
+SEARCH_MIN_SIMILARITY = float(os.environ.get("SEARCH_MIN_SIMILARITY", "0.3"))  # same default as pg_trgm
+SEARCH_TAGLINE_WEIGHT = 0.8  # a full tagline match ranks just below a full title match
+SEARCH_MAX_QUERY_CHARS = 100
+COMPLETE_OVERFETCH = 4
+SEARCH_REFRESH_SECONDS = float(os.environ.get("SEARCH_REFRESH_SECONDS", "1"))
+PREFIX_KEY_BYTES = 32  # autocomplete entries are sorted on this many bytes of text
+
+MAGIC = b"BNGSRCH1"
+ALIGN = 64
+MOVIE, PERSON = 0, 1
+KINDS = {"movie": MOVIE, "person": PERSON}
+KIND_NAMES = {MOVIE: "movie", PERSON: "person"}
+
+ACCENTS = re.compile(r"[\u0300-\u036f]")
+NON_WORD = re.compile(r"[\W_]+")
+EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def normalize(text):
+    # lowercase, accents stripped, punctuation as spaces
+    text = ACCENTS.sub("", unicodedata.normalize("NFKD", text or ""))
+    return " ".join(NON_WORD.sub(" ", text.lower()).split())
+
+
+def trigrams(normalized):
+    # pg_trgm style: every word padded with two spaces in front and one behind
+    codes = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            codes.add((ord(padded[i]) << 42) | (ord(padded[i + 1]) << 21) | ord(padded[i + 2]))
+    return codes
+
+
+def doc_key(kind, doc_id):
+    return (int(doc_id) << 1) | kind
+
+
+def movie_doc(movie, genre_ids):
+    # log record for a row of the movie table
+    return {
+        "kind": "movie",
+        "id": movie["movie_id"],
+        "name": movie.get("title"),
+        "tagline": movie.get("tagline"),
+        "release_date": movie.get("release_date"),
+        "vote_avg": movie.get("vote_avg"),
+        "popularity": movie.get("popularity"),
+        "genres": sorted(set(genre_ids)),
+    }
+
+
+def person_doc(member):
+    # log record for a row of the crew_member table
+    return {
+        "kind": "person",
+        "id": member["member_id"],
+        "name": member.get("name"),
+        "popularity": member.get("popularity"),
+    }
+
+
+def log_path(path):
+    return f"{path}.log"
+
+
+def append_updates(path, docs):
+    # one line per document, written with a single call so readers never see half a batch
+    if not docs:
+        return
+    lines = "".join(json.dumps(doc, separators=(",", ":")) + "\n" for doc in docs)
+    with open(log_path(path), "a", encoding="utf-8") as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Doc:
+    # a document from the update log, kept in memory until the next compaction
+    __slots__ = ("key", "kind", "doc_id", "name", "norm", "year", "rating", "popularity",
+                 "genres", "title_grams", "tagline_grams")
+
+    def __init__(self, record):
+        self.kind = KINDS[record["kind"]]
+        self.doc_id = int(record["id"])
+        self.key = doc_key(self.kind, self.doc_id)
+        self.name = record.get("name") or ""
+        self.norm = normalize(self.name)
+        release_date = record.get("release_date") or ""
+        self.year = int(release_date[:4]) if release_date[:4].isdigit() else 0
+        self.rating = float(record.get("vote_avg") or 0)
+        self.popularity = float(record.get("popularity") or 0)
+        self.genres = [int(g) for g in record.get("genres") or []]
+        self.title_grams = gram_array(trigrams(self.norm))
+        self.tagline_grams = gram_array(trigrams(normalize(record.get("tagline"))))
+
+
+def gram_array(codes):
+    # sorted int64 array, far smaller than a set when hundreds of thousands of docs are held
+    return np.sort(np.fromiter(codes, dtype=np.int64, count=len(codes)))
+
+
+def write_arrays(path, arrays, meta, magic=MAGIC):
+    # header json followed by 64-byte aligned raw arrays, swapped in atomically
+    # recommender.py stores its model in the same format under its own magic
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+    data_start = -(-(len(magic) + 8 + len(header)) // ALIGN) * ALIGN
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(magic)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_arrays(path, magic=MAGIC):
+    # every array is a read-only view into one memory map, nothing is copied
+    with open(path, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a {magic.decode()} file")
+        header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+        data_start = -(-f.tell() // ALIGN) * ALIGN
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        start = data_start + offset
+        count = int(np.prod(shape))
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+    return arrays, header["meta"]
+
+
+def empty_arrays():
+    return {
+        "keys": np.zeros(0, dtype=np.int64),
+        "year": np.zeros(0, dtype=np.int16),
+        "rating": np.zeros(0, dtype=np.float32),
+        "popularity": np.zeros(0, dtype=np.float32),
+        "genre_mask": np.zeros(0, dtype=np.uint64),
+        "title_len": np.zeros(0, dtype=np.int16),
+        "tagline_len": np.zeros(0, dtype=np.int16),
+        "name_offsets": np.zeros(1, dtype=np.int64),
+        "name_blob": np.zeros(0, dtype=np.uint8),
+        "norm_offsets": np.zeros(1, dtype=np.int64),
+        "norm_blob": np.zeros(0, dtype=np.uint8),
+        "title_grams": np.zeros(0, dtype=np.int64),
+        "title_offsets": np.zeros(1, dtype=np.int64),
+        "title_docs": np.zeros(0, dtype=np.int32),
+        "tagline_grams": np.zeros(0, dtype=np.int64),
+        "tagline_offsets": np.zeros(1, dtype=np.int64),
+        "tagline_docs": np.zeros(0, dtype=np.int32),
+        "prefix_docs": np.zeros(0, dtype=np.int32),
+        "prefix_starts": np.zeros(0, dtype=np.int64),
+    }
+
+
+def min_shared(n_codes, weight):
+    # both scores are at most weight * shared / n_codes, so fewer shared trigrams can't reach the threshold
+    return max(1, int(np.ceil(SEARCH_MIN_SIMILARITY * n_codes / weight - 1e-9)))
+
+
+def posting_lists(grams, offsets, docs, codes):
+    # the (doc-sorted) posting list of every query code, empty for codes the index has never seen
+    idx = np.minimum(np.searchsorted(grams, codes), max(len(grams) - 1, 0))
+    found = grams[idx] == codes if len(grams) else np.zeros(len(codes), dtype=bool)
+    return [docs[offsets[i]:offsets[i + 1]] if hit else EMPTY for i, hit in zip(idx.tolist(), found.tolist())]
+
+
+def count_hits(lists, size):
+    # shared trigram count for every doc, a doc is at most once in each posting list
+    return np.bincount(np.concatenate(lists), minlength=size) if lists else np.zeros(size, dtype=np.intp)
+
+
+def blob_items(offsets, blob, positions):
+    raw = blob.tobytes()
+    offsets = offsets.tolist()
+    return [raw[offsets[i]:offsets[i + 1]] for i in positions]
+
+
+def pack_items(items):
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(item) for item in items])
+    return offsets, np.frombuffer(b"".join(items), dtype=np.uint8)
+
+
+def merge_postings(grams, offsets, docs, keep, remap, extra_grams, extra_docs):
+    # old postings minus replaced docs, renumbered, plus the postings of the new docs
+    old_grams = np.repeat(grams, np.diff(offsets))
+    alive = keep[docs]
+    all_grams = np.concatenate([old_grams[alive], extra_grams])
+    all_docs = np.concatenate([remap[docs[alive]], extra_docs]).astype(np.int32)
+    order = np.lexsort((all_docs, all_grams))
+    all_grams, all_docs = all_grams[order], all_docs[order]
+    unique, starts = np.unique(all_grams, return_index=True)
+    new_offsets = np.append(starts, len(all_grams)).astype(np.int64)
+    return unique.astype(np.int64), new_offsets, all_docs
+
+
+def prefix_entries(norm_offsets, norm_blob):
+    # one entry per word start of every normalized name, sorted by the bytes that follow
+    starts = np.concatenate([norm_offsets[:-1][np.diff(norm_offsets) > 0], np.flatnonzero(norm_blob == ord(" ")) + 1])
+    docs = np.searchsorted(norm_offsets, starts, side="right") - 1
+    ends = norm_offsets[docs + 1]
+    raw = norm_blob.tobytes()
+    keys = np.array(
+        [raw[s:min(s + PREFIX_KEY_BYTES, e)] for s, e in zip(starts.tolist(), ends.tolist())],
+        dtype=f"S{PREFIX_KEY_BYTES}"
+    )
+    order = np.argsort(keys, kind="stable")
+    return docs[order].astype(np.int32), starts[order].astype(np.int64)
+
+
+def word_prefix(text, prefix):
+    return text.startswith(prefix) or f" {prefix}" in f" {text}"
+
+
+class SearchIndex:
+    # mapped base arrays plus an in-memory segment for documents from the update log
+    def __init__(self, arrays=None, meta=None):
+        self.base = arrays or empty_arrays()
+        meta = meta or {}
+        self.genre_bits = {int(g): i for i, g in enumerate(meta.get("genres", []))}
+        self.size = len(self.base["keys"])
+        self.replaced = np.zeros(self.size, dtype=bool)  # base docs superseded by a newer version
+        self.docs = {}  # key -> Doc
+        self.doc_title_grams = {}  # trigram -> set of keys, for the in-memory docs
+        self.doc_tagline_grams = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        # every replaced base doc has its newer version in self.docs
+        return self.size - int(self.replaced.sum()) + len(self.docs)
+
+    def base_position(self, key):
+        keys = self.base["keys"]
+        i = int(np.searchsorted(keys, key))
+        return i if i < self.size and keys[i] == key else None
+
+    def upsert(self, records):
+        with self.lock:
+            for record in records:
+                doc = Doc(record)
+                old = self.docs.get(doc.key)
+                if old is not None:
+                    for gram in old.title_grams.tolist():
+                        self.doc_title_grams[gram].discard(doc.key)
+                    for gram in old.tagline_grams.tolist():
+                        self.doc_tagline_grams[gram].discard(doc.key)
+                position = self.base_position(doc.key)
+                if position is not None:
+                    self.replaced[position] = True
+                for genre in doc.genres:
+                    self.genre_bits.setdefault(genre, len(self.genre_bits))
+                self.docs[doc.key] = doc
+                for gram in doc.title_grams.tolist():
+                    self.doc_title_grams.setdefault(gram, set()).add(doc.key)
+                for gram in doc.tagline_grams.tolist():
+                    self.doc_tagline_grams.setdefault(gram, set()).add(doc.key)
+
+    def genre_mask(self, genre_ids):
+        # genres nobody has get no bit, a filter on only those matches nothing
+        mask = 0
+        for genre in genre_ids:
+            bit = self.genre_bits.get(int(genre))
+            if bit is not None and bit < 64:
+                mask |= 1 << bit
+        return mask
+
+    def search(self, query, kind=None, genres=None, year=None, min_rating=None, limit=20):
+        # [(key, score)] best first, ties broken by popularity
+        codes = gram_array(trigrams(normalize(query)[:SEARCH_MAX_QUERY_CHARS]))
+        if not len(codes):
+            return []
+        genre_mask = self.genre_mask(genres) if genres else None
+        if genres and not genre_mask:
+            return []
+        facets = (kind, genre_mask, year, min_rating)
+        results = self.search_base(codes, facets, limit) + self.search_docs(codes, facets)
+        results.sort(key=lambda r: (-r[1], -r[2]))
+        return [(key, score) for key, score, _ in results[:limit]]
+
+    def search_base(self, codes, facets, limit):
+        b = self.base
+        if not self.size:
+            return []
+        n_codes = len(codes)
+        title_shared = count_hits(posting_lists(b["title_grams"], b["title_offsets"], b["title_docs"], codes), self.size)
+        candidates = title_shared >= min_shared(n_codes, 1.0)
+        tagline_need = min_shared(n_codes, SEARCH_TAGLINE_WEIGHT)
+        tagline_shared = None
+        if tagline_need <= n_codes:
+            tagline_shared = count_hits(
+                posting_lists(b["tagline_grams"], b["tagline_offsets"], b["tagline_docs"], codes), self.size
+            )
+            candidates |= tagline_shared >= tagline_need
+        candidates = np.flatnonzero(candidates)
+        candidates = candidates[self.facet_filter(candidates, *facets)]
+
+        shared = title_shared[candidates]
+        title_score = shared / (n_codes + b["title_len"][candidates] - shared)
+        scores = title_score
+        if tagline_shared is not None:
+            scores = np.maximum(scores, tagline_shared[candidates] / n_codes * SEARCH_TAGLINE_WEIGHT)
+        matched = scores >= SEARCH_MIN_SIMILARITY
+        candidates, scores = candidates[matched], scores[matched]
+        popularity = b["popularity"][candidates]
+        if len(candidates) > limit:
+            # only the top slice is handed back for the final sort
+            top = np.argpartition(-(scores + popularity / (popularity.max() + 1) * 1e-6), limit - 1)[:limit]
+            candidates, scores, popularity = candidates[top], scores[top], popularity[top]
+        return list(zip(b["keys"][candidates].tolist(), scores.tolist(), popularity.tolist()))
+
+    def facet_filter(self, candidates, kind, genre_mask, year, min_rating):
+        # boolean mask over base positions, applied before any scoring
+        b = self.base
+        keep = ~self.replaced[candidates]
+        if kind is not None:
+            keep &= (b["keys"][candidates] & 1) == kind
+        if year:
+            keep &= b["year"][candidates] == year
+        if min_rating:
+            keep &= b["rating"][candidates] >= min_rating
+        if genre_mask:
+            keep &= (b["genre_mask"][candidates] & np.uint64(genre_mask)) != 0
+        return keep
+
+    def search_docs(self, codes, facets):
+        kind, genre_mask, year, min_rating = facets
+        codes = codes.tolist()
+        with self.lock:
+            title_shared, tagline_shared = {}, {}
+            for code in codes:
+                for key in self.doc_title_grams.get(code, ()):
+                    title_shared[key] = title_shared.get(key, 0) + 1
+                for key in self.doc_tagline_grams.get(code, ()):
+                    tagline_shared[key] = tagline_shared.get(key, 0) + 1
+            docs = [self.docs[key] for key in set(title_shared) | set(tagline_shared)]
+        results = []
+        for doc in docs:
+            if kind is not None and doc.kind != kind:
+                continue
+            if (year and doc.year != year) or (min_rating and doc.rating < min_rating):
+                continue
+            if genre_mask and not self.genre_mask(doc.genres) & genre_mask:
+                continue
+            shared = title_shared.get(doc.key, 0)
+            score = max(
+                shared / (len(codes) + len(doc.title_grams) - shared),
+                tagline_shared.get(doc.key, 0) / len(codes) * SEARCH_TAGLINE_WEIGHT
+            )
+            if score >= SEARCH_MIN_SIMILARITY:
+                results.append((doc.key, score, doc.popularity))
+        return results
+
+    def complete(self, prefix, kind=None, limit=10):
+        # [(key, name)] whose name, or any word in it, starts with prefix, most popular first
+        norm = normalize(prefix)
+        if not norm:
+            return []
+        results = self.complete_base(norm, kind, limit)
+        with self.lock:
+            docs = list(self.docs.values())
+        for doc in docs:
+            if (kind is None or doc.kind == kind) and word_prefix(doc.norm, norm):
+                results.append((doc.key, doc.name, doc.popularity))
+        results.sort(key=lambda r: -r[2])
+        seen, completions = set(), []
+        for key, name, _ in results:
+            if key not in seen:
+                seen.add(key)
+                completions.append((key, name))
+        return completions[:limit]
+
+    def complete_base(self, norm, kind, limit):
+        b = self.base
+        prefix_docs, prefix_starts = b["prefix_docs"], b["prefix_starts"]
+        entries = len(prefix_docs)
+        if not entries:
+            return []
+        target = norm.encode("utf-8")[:PREFIX_KEY_BYTES]
+        norm_offsets, norm_blob = b["norm_offsets"], b["norm_blob"]
+
+        def entry_key(i):
+            start = int(prefix_starts[i])
+            return norm_blob[start:min(start + len(target), int(norm_offsets[prefix_docs[i] + 1]))].tobytes()
+
+        # entries are sorted by text, so the matches are one contiguous range
+        lo, hi = 0, entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if entry_key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        first, hi = lo, entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if entry_key(mid) <= target:
+                lo = mid + 1
+            else:
+                hi = mid
+        docs = prefix_docs[first:lo]
+        docs = docs[~self.replaced[docs]]
+        if kind is not None:
+            docs = docs[(b["keys"][docs] & 1) == kind]
+        if len(norm.encode("utf-8")) > PREFIX_KEY_BYTES:
+            docs = np.array([d for d in docs.tolist() if word_prefix(self.base_norm(d), norm)], dtype=np.int64)
+        popularity = b["popularity"][docs]
+        # a doc is in the range once per matching word, so a few times the limit leaves enough after dedup
+        keep = COMPLETE_OVERFETCH * limit
+        if len(docs) > keep:
+            top = np.argpartition(-popularity, keep - 1)[:keep]
+            docs, popularity = docs[top], popularity[top]
+        return [(int(b["keys"][d]), self.base_name(d), p) for d, p in zip(docs.tolist(), popularity.tolist())]
+
+    def base_name(self, position):
+        offsets = self.base["name_offsets"]
+        return self.base["name_blob"][offsets[position]:offsets[position + 1]].tobytes().decode("utf-8")
+
+    def base_norm(self, position):
+        offsets = self.base["norm_offsets"]
+        return self.base["norm_blob"][offsets[position]:offsets[position + 1]].tobytes().decode("utf-8")
+
+    def lookup(self, key):
+        # display fields for a search hit
+        with self.lock:
+            doc = self.docs.get(key)
+        if doc is not None:
+            return {"kind": KIND_NAMES[doc.kind], "id": doc.doc_id, "name": doc.name, "year": doc.year or None}
+        position = self.base_position(key)
+        year = int(self.base["year"][position])
+        return {"kind": KIND_NAMES[key & 1], "id": key >> 1, "name": self.base_name(position), "year": year or None}
+
+    def merged_arrays(self):
+        # base docs that were not replaced plus every in-memory doc, as a new set of arrays
+        b = self.base
+        with self.lock:
+            docs = sorted(self.docs.values(), key=lambda d: d.key)
+            genre_bits = dict(self.genre_bits)
+        if len(genre_bits) > 64:
+            logging.warning(f"{len(genre_bits)} genres, only the first 64 can be used as search facets")
+
+        keep = ~self.replaced
+        old_positions = np.flatnonzero(keep)
+        keys = np.concatenate([b["keys"][keep], np.array([d.key for d in docs], dtype=np.int64)])
+        order = np.argsort(keys, kind="stable")
+        # position of every old doc and every new doc in the merged, key-sorted arrays
+        rank = np.empty(len(keys), dtype=np.int64)
+        rank[order] = np.arange(len(keys))
+        remap = np.full(self.size, -1, dtype=np.int64)
+        remap[old_positions] = rank[:len(old_positions)]
+        new_positions = rank[len(old_positions):]
+
+        def column(name, values, dtype):
+            return np.concatenate([b[name][keep], np.array(values, dtype=dtype)])[order]
+
+        arrays = {
+            "keys": keys[order],
+            "year": column("year", [d.year for d in docs], np.int16),
+            "rating": column("rating", [d.rating for d in docs], np.float32),
+            "popularity": column("popularity", [d.popularity for d in docs], np.float32),
+            "genre_mask": column("genre_mask", [
+                sum(1 << genre_bits[g] for g in set(d.genres) if genre_bits[g] < 64) for d in docs
+            ], np.uint64),
+            "title_len": column("title_len", [len(d.title_grams) for d in docs], np.int16),
+            "tagline_len": column("tagline_len", [len(d.tagline_grams) for d in docs], np.int16),
+        }
+        order = order.tolist()
+        for field, new_values in (("name", [d.name for d in docs]), ("norm", [d.norm for d in docs])):
+            items = blob_items(b[f"{field}_offsets"], b[f"{field}_blob"], old_positions.tolist())
+            items += [value.encode("utf-8") for value in new_values]
+            arrays[f"{field}_offsets"], arrays[f"{field}_blob"] = pack_items([items[i] for i in order])
+
+        for field in ("title", "tagline"):
+            doc_grams = [d.title_grams if field == "title" else d.tagline_grams for d in docs]
+            extra_grams = np.concatenate(doc_grams) if docs else EMPTY
+            extra_docs = np.repeat(new_positions, [len(grams) for grams in doc_grams])
+            arrays[f"{field}_grams"], arrays[f"{field}_offsets"], arrays[f"{field}_docs"] = merge_postings(
+                b[f"{field}_grams"], b[f"{field}_offsets"], b[f"{field}_docs"], keep, remap, extra_grams, extra_docs
+            )
+        arrays["prefix_docs"], arrays["prefix_starts"] = prefix_entries(arrays["norm_offsets"], arrays["norm_blob"])
+
+        genres = [g for g, _ in sorted(genre_bits.items(), key=lambda item: item[1])]
+        return arrays, {"genres": genres, "docs": len(keys), "built_at": time.time()}
+
+
+def open_index(path=SEARCH_INDEX_PATH):
+    # returns (index, bytes of the log replayed), a missing base file means an empty index
+    index = SearchIndex(*read_arrays(path)) if os.path.exists(path) else SearchIndex()
+    return index, replay_log(index, log_path(path), 0)
+
+
+def replay_log(index, path, offset):
+    # applies complete lines after offset, returns the offset to continue from next time
+    if not os.path.exists(path):
+        return offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    if end:
+        index.upsert(json.loads(line) for line in data[:end].splitlines() if line.strip())
+    return offset + end
+
+
+def compact(path=SEARCH_INDEX_PATH):
+    # single writer: run by the importer once it has finished appending, or from cron
+    started = time.monotonic()
+    index, replayed = open_index(path)
+    if not replayed:
+        return
+    arrays, meta = index.merged_arrays()
+    write_arrays(path, arrays, meta)
+    # the log is replaced rather than truncated, so readers notice the new file by its inode
+    with open(log_path(path), "rb") as f:
+        f.seek(replayed)
+        rest = f.read()
+    with open(f"{log_path(path)}.tmp", "wb") as f:
+        f.write(rest)
+    os.replace(f"{log_path(path)}.tmp", log_path(path))
+    logging.warning(f"Search index compacted: {meta['docs']} docs in {time.monotonic() - started:.1f}s")
+
+
+class LiveSearchIndex:
+    # what the backend serves from: reopens when the file is replaced and tails the update log
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.index = None
+        self.base_stat = None
+        self.log_inode = None
+        self.log_offset = 0
+        self.checked_at = 0.0
+
+    def current(self):
+        # None until an index file or update log exists
+        with self.lock:
+            if time.monotonic() - self.checked_at >= SEARCH_REFRESH_SECONDS:
+                self.checked_at = time.monotonic()
+                try:
+                    self.refresh_locked()
+                except Exception as e:
+                    logging.error(f"Refreshing the search index failed ({e})")
+            return self.index
+
+    def refresh_locked(self):
+        base_stat = self.stat(self.path)
+        log_inode, _, log_size = self.stat(log_path(self.path)) or (None, None, 0)
+        if self.index is None or base_stat != self.base_stat or log_inode != self.log_inode or log_size < self.log_offset:
+            if base_stat is None and not log_size:
+                return
+            # stat the log before reading it, a replacement after this point is caught next time
+            self.index, self.log_offset = open_index(self.path)
+            self.base_stat, self.log_inode = base_stat, log_inode
+        elif log_size > self.log_offset:
+            self.log_offset = replay_log(self.index, log_path(self.path), self.log_offset)
+
+    def stat(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def build_from_database(client, path=SEARCH_INDEX_PATH):
+    from recommender import fetch_rows
+    genres = {}
+    for row in fetch_rows(client, "movie_genre", "movie_id, genre_id", ["movie_id", "genre_id"]):
+        genres.setdefault(row["movie_id"], []).append(row["genre_id"])
+    movies = fetch_rows(client, "movie", "movie_id, title, tagline, release_date, vote_avg, popularity", ["movie_id"])
+    people = fetch_rows(client, "crew_member", "member_id, name, popularity", ["member_id"])
+
+    index = SearchIndex()
+    index.upsert(movie_doc(m, genres.get(m["movie_id"], [])) for m in movies)
+    index.upsert(person_doc(p) for p in people)
+    arrays, meta = index.merged_arrays()
+    write_arrays(path, arrays, meta)
+    if os.path.exists(log_path(path)):
+        os.remove(log_path(path))  # everything in it is older than what we just read
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or compact the search index")
+    parser.add_argument("--build", action="store_true", help="rebuild from the database")
+    parser.add_argument("--compact", action="store_true", help="fold the update log into the index file")
+    parser.add_argument("--path", default=SEARCH_INDEX_PATH)
+    args = parser.parse_args()
+    if args.build:
+        from user_context import get_supabase
+        print(f"Indexed {build_from_database(get_supabase(), args.path)['docs']} docs into {args.path}")
+    elif args.compact:
+        compact(args.path)
+    else:
+        parser.print_help()
+        sys.exit(1)
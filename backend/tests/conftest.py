@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the backend modules import each other by name, as gunicorn runs them from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
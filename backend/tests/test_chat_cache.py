@@ -0,0 +1,99 @@
+import time
+import threading
+import pytest
+from chat_cache import ChatCache, DiskCache, LRUCache, cache_key
+
+WAITERS = 8
+
+
+def run_concurrently(cache, key, compute):
+    # WAITERS threads ask for the same key while compute blocks, returns each thread's (value, kind) or error
+    results = [None] * WAITERS
+    start = threading.Barrier(WAITERS)
+
+    def worker(i):
+        start.wait()
+        try:
+            results[i] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(WAITERS)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_coalesced_error_reaches_every_waiter():
+    cache = ChatCache(LRUCache(10, 60), wait_timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("upstream 502")
+
+    threads, results = run_concurrently(cache, "k", compute)
+    while cache.stats()["misses"] + cache.stats()["coalesced"] < WAITERS:
+        time.sleep(0.001)  # until every thread has joined the in-flight call
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream 502" for result in results)
+    assert cache.stats()["coalesced"] == WAITERS - 1
+    # a failed call isn't cached, the next request tries upstream again
+    assert cache.get_or_compute("k", lambda: "ok") == ("ok", "miss")
+
+
+def test_coalesced_value_is_shared_and_cached():
+    cache = ChatCache(LRUCache(10, 60), wait_timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"content": "Heat (1995)"}
+
+    threads, results = run_concurrently(cache, "k", compute)
+    while cache.stats()["misses"] + cache.stats()["coalesced"] < WAITERS:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(kind for _, kind in results) == ["coalesced"] * (WAITERS - 1) + ["miss"]
+    assert all(value == {"content": "Heat (1995)"} for value, _ in results)
+    assert cache.get_or_compute("k", compute) == ({"content": "Heat (1995)"}, "hit")
+
+
+def test_waiter_times_out():
+    cache = ChatCache(LRUCache(10, 60), wait_timeout=0.05)
+    release = threading.Event()
+    leader = threading.Thread(target=cache.get_or_compute, args=("k", lambda: release.wait(5) and "late"))
+    leader.start()
+    while cache.stats()["misses"] < 1:
+        time.sleep(0.001)
+    with pytest.raises(TimeoutError):
+        cache.get_or_compute("k", lambda: "never called")
+    release.set()
+    leader.join(5)
+
+
+def test_disk_tier_refills_memory(tmp_path):
+    disk = DiskCache(str(tmp_path / "chat_cache.sqlite3"), 60)
+    ChatCache(LRUCache(10, 60), disk).set("k", "cached")
+    cache = ChatCache(LRUCache(10, 60), disk)
+    assert cache.get("k") == "cached"
+    assert cache.memory.get("k") == "cached"
+
+
+def test_cache_key_ignores_whitespace():
+    a = cache_key("llama", [{"role": "user", "content": "recommend  a\nmovie"}])
+    b = cache_key("llama", [{"role": "user", "content": "recommend a movie "}])
+    assert a == b
+    assert a != cache_key("llama", [{"role": "user", "content": "recommend a show"}])
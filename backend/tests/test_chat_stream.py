@@ -0,0 +1,125 @@
+import json
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+import groqProxy
+from chat_cache import ChatCache, LRUCache, StreamedCompletion
+
+
+class FakeStream:
+    # stands in for a streamed requests.Response from the LLM
+    def __init__(self, words, release=None, finish=True):
+        self.words = words
+        self.release = release
+        self.finish = finish
+        self.closed = False
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        for i, word in enumerate(self.words):
+            if i == 1 and self.release is not None:
+                self.release.wait(5)
+            delta = {'role': 'assistant', 'content': word} if i == 0 else {'content': word}
+            chunk = {'id': 'c1', 'model': 'm', 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+            yield f"data: {json.dumps(chunk)}"
+            yield ""
+        if self.finish:
+            yield "data: [DONE]"
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def proxy(monkeypatch):
+    monkeypatch.setattr(groqProxy, 'GROQ_API_KEY', 'test')
+    monkeypatch.setattr(groqProxy, 'chat_cache', ChatCache(LRUCache(10, 60), wait_timeout=5))
+    upstream = SimpleNamespace(calls=[], next_stream=lambda: FakeStream(["Try ", "Heat"]))
+
+    def post_upstream(payload, stream):
+        upstream.calls.append(payload)
+        return upstream.next_stream()
+
+    monkeypatch.setattr(groqProxy, 'post_upstream', post_upstream)
+    return upstream
+
+
+def chat(client, stream=True):
+    return client.post('/api/chat', json={'messages': [{'role': 'user', 'content': 'recommend a movie'}], 'stream': stream})
+
+
+def replayed_text(body):
+    text = ''
+    for line in body.decode().split('\n\n'):
+        if line.startswith('data: ') and line != 'data: [DONE]':
+            text += json.loads(line[6:])['choices'][0]['delta'].get('content') or ''
+    return text
+
+
+def test_streamed_reply_is_cached(proxy):
+    client = groqProxy.app.test_client()
+    first = chat(client)
+    assert first.headers['X-Cache'] == 'miss'
+    assert replayed_text(first.data) == 'Try Heat'
+
+    second = chat(client)
+    assert second.headers['X-Cache'] == 'hit'
+    assert replayed_text(second.data) == 'Try Heat'
+    non_streamed = chat(client, stream=False)
+    assert non_streamed.get_json()['choices'][0]['message'] == {'role': 'assistant', 'content': 'Try Heat'}
+    assert len(proxy.calls) == 1
+    assert groqProxy.chat_cache.stats()['misses'] == 1
+    assert groqProxy.chat_cache.stats()['hits'] == 2
+
+
+def test_identical_streams_share_one_upstream_call(proxy):
+    release = threading.Event()
+    proxy.next_stream = lambda: FakeStream(["Try ", "Heat"], release)
+    results = {}
+
+    def request(name):
+        response = chat(groqProxy.app.test_client())
+        results[name] = (response.headers['X-Cache'], replayed_text(response.data))
+
+    leader = threading.Thread(target=request, args=('leader',))
+    leader.start()
+    while not groqProxy.chat_cache.stats()['misses']:
+        time.sleep(0.001)
+    followers = [threading.Thread(target=request, args=(i,)) for i in range(3)]
+    for follower in followers:
+        follower.start()
+    while groqProxy.chat_cache.stats()['coalesced'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(proxy.calls) == 1
+    assert results['leader'] == ('miss', 'Try Heat')
+    assert [results[i] for i in range(3)] == [('coalesced', 'Try Heat')] * 3
+
+
+def test_unfinished_stream_is_not_cached(proxy):
+    proxy.next_stream = lambda: FakeStream(["Try "], finish=False)
+    client = groqProxy.app.test_client()
+    chat(client).get_data()
+    assert not groqProxy.chat_cache.in_flight
+    proxy.next_stream = lambda: FakeStream(["Try ", "Heat"])
+    assert chat(client).headers['X-Cache'] == 'miss'
+    assert len(proxy.calls) == 2
+
+
+def test_streamed_completion_ignores_non_data_lines():
+    collected = StreamedCompletion()
+    for line in [': keep-alive', 'data: {"id": "x", "model": "m", "choices": [{"delta": {"content": "Hi"}, "finish_reason": "stop"}]}']:
+        collected.add(line)
+    assert collected.completion() is None
+    collected.add('data: [DONE]')
+    assert collected.completion()['choices'][0] == {'index': 0, 'message': {'role': 'assistant', 'content': 'Hi'}, 'finish_reason': 'stop'}
+
+
+def test_malformed_messages_are_rejected(proxy):
+    client = groqProxy.app.test_client()
+    for messages in (["hello"], [{'role': 'user', 'content': 'hi'}, None], "hello"):
+        assert client.post('/api/chat', json={'messages': messages}).status_code == 400
+    assert proxy.calls == []
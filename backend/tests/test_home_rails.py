@@ -0,0 +1,60 @@
+import os
+import time
+import threading
+import pytest
+import home_rails
+from home_rails import HomeRails, write_document
+
+
+@pytest.fixture
+def slow_build(monkeypatch):
+    # build_home_rails blocks until released, like six slow Supabase queries
+    build = threading.Event()
+    release = threading.Event()
+
+    def build_home_rails(client):
+        build.set()
+        release.wait(5)
+        return {"popular": [{"movie_id": 2}]}
+
+    monkeypatch.setattr(home_rails, "build_home_rails", build_home_rails)
+    yield build, release
+    release.set()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_stale_document_is_served_while_rebuilding(tmp_path, slow_build):
+    build, release = slow_build
+    path = str(tmp_path / "rails.json")
+    write_document({"popular": [{"movie_id": 1}]}, path)
+    old = time.time() - home_rails.RAILS_MAX_AGE - 10
+    os.utime(path, (old, old))
+    rails = HomeRails(lambda: None, path)
+
+    body, etag = rails.current()
+    assert b'"movie_id":1' in body
+    assert build.wait(5)
+    assert rails.current() == (body, etag)  # no second build while one runs
+
+    release.set()
+    wait_for(lambda: not rails.rebuilding)
+    new_body, new_etag = rails.current()
+    assert b'"movie_id":2' in new_body and new_etag != etag
+
+
+def test_nothing_is_served_until_the_first_build(tmp_path, slow_build):
+    build, release = slow_build
+    rails = HomeRails(lambda: None, str(tmp_path / "rails.json"))
+
+    assert rails.current() == (None, None)
+    assert build.wait(5)
+    release.set()
+    wait_for(lambda: not rails.rebuilding)
+    body, etag = rails.current()
+    assert b'"movie_id":2' in body and etag
@@ -0,0 +1,93 @@
+import os
+import time
+from search_index import write_arrays
+from recommender import (
+    MAGIC, RECS_RECENT_KEEP_SECONDS, RecentInteractions, RecommendationService, build_arrays, open_model, recent_path
+)
+
+MOVIES = {
+    1: {"movie_id": 1, "title": "Alien", "poster_path": "/alien.jpg", "popularity": 40.0, "release_date": "1979-05-25"},
+    2: {"movie_id": 2, "title": "Aliens", "poster_path": None, "popularity": 35.0, "release_date": "1986-07-18"},
+    3: {"movie_id": 3, "title": "Heat", "poster_path": "/heat.jpg", "popularity": 30.0, "release_date": "1995-12-15"},
+    4: {"movie_id": 4, "title": "Ronin", "poster_path": "/ronin.jpg", "popularity": 10.0, "release_date": "1998-09-25"},
+}
+USER_ITEMS = {
+    "a": {1: 1.0, 2: 1.0},
+    "b": {1: 1.0, 2: 1.0},
+    "c": {3: 1.0, 4: 1.0},
+    "d": {1: 1.0},
+}
+GENRES = [(1, 878), (2, 878), (3, 80), (4, 80)]
+
+
+def write_model(path, user_items=USER_ITEMS):
+    arrays, meta = build_arrays(user_items, MOVIES.keys(), GENRES, [], MOVIES)
+    write_arrays(path, arrays, meta, MAGIC)
+    return meta
+
+
+def test_recommends_from_the_model_file(tmp_path):
+    path = str(tmp_path / "recommendations.bin")
+    write_model(path)
+    model = open_model(path)
+
+    assert model.recommend("d", n=1)[0][0] == 2
+    assert 1 not in [movie_id for movie_id, _ in model.recommend("d", n=3)]
+    # unknown users get the most watched movies
+    assert [movie_id for movie_id, _ in model.recommend("nobody", n=2)] == [1, 2]
+    assert model.movie(2) == {"movie_id": 2, "popularity": 35.0, "title": "Aliens", "poster_path": None, "release_date": "1986-07-18"}
+    assert model.movie(99) == {"movie_id": 99}
+
+
+def test_interactions_apply_immediately(tmp_path):
+    path = str(tmp_path / "recommendations.bin")
+    write_model(path)
+    model = open_model(path)
+
+    assert model.add_interaction("new", 3)
+    assert not model.add_interaction("new", 99)
+    assert model.user_movie_ids("new") == [3]
+    assert model.recommend("new", n=1)[0][0] == 4
+
+
+def test_service_waits_for_a_build_and_picks_up_new_ones(tmp_path, monkeypatch):
+    monkeypatch.setattr("recommender.RECS_REFRESH_SECONDS", 0)
+    path = str(tmp_path / "recommendations.bin")
+    service = RecommendationService(path)
+    assert service.current() is None
+
+    meta = write_model(path)
+    first = service.current()
+    assert first is not None and service.current() is first
+    first.add_interaction("new", 3, at=meta["built_at"] - 1)  # older than this build, already in it
+    first.add_interaction("new", 4, at=meta["built_at"] + 3600)  # newer than the next build too
+    assert first.user_movie_ids("new") == [4]
+
+    write_model(path, dict(USER_ITEMS, new={3: 1.0}))
+    os.utime(path, ns=(0, 0))  # a different mtime even on coarse filesystem clocks
+    second = service.current()
+    assert second is not first
+    assert sorted(second.user_movie_ids("new")) == [3, 4]
+
+
+def test_watches_reach_every_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr("recommender.RECS_REFRESH_SECONDS", 0)
+    path = str(tmp_path / "recommendations.bin")
+    write_model(path)
+    workers = [RecommendationService(path), RecommendationService(path)]
+
+    assert workers[0].current().add_interaction("new", 3)
+    assert workers[1].current().user_movie_ids("new") == [3]
+    assert workers[1].current().recommend("new", n=1)[0][0] == 4
+
+
+def test_watches_during_a_build_are_kept(tmp_path):
+    # the build reads the database after built_at, a watch in between is applied on top of it
+    path = str(tmp_path / "recommendations.bin")
+    built_at = time.time()
+    recent = RecentInteractions(recent_path(path))
+    recent.add("new", 3, 1.0, at=built_at + 1)
+    recent.add("new", 1, 1.0, at=built_at - 2 * RECS_RECENT_KEEP_SECONDS)
+    arrays, meta = build_arrays(USER_ITEMS, MOVIES.keys(), GENRES, [], MOVIES, built_at)
+    write_arrays(path, arrays, meta, MAGIC)
+    assert open_model(path, recent).user_movie_ids("new") == [3]
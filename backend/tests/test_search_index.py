@@ -0,0 +1,113 @@
+import os
+from search_index import (
+    MOVIE, PERSON, LiveSearchIndex, SearchIndex, append_updates, compact, doc_key, log_path, movie_doc,
+    open_index, person_doc, write_arrays
+)
+
+
+def movie(movie_id, title, year, rating, genres, popularity=1.0, tagline=None):
+    return movie_doc({
+        "movie_id": movie_id,
+        "title": title,
+        "tagline": tagline,
+        "release_date": f"{year}-01-01",
+        "vote_avg": rating,
+        "popularity": popularity,
+    }, genres)
+
+
+BASE = [
+    movie(1, "The Matrix", 1999, 8.7, [28, 878], popularity=80),
+    movie(2, "The Matrix Revolutions", 2003, 6.7, [28, 878], popularity=40),
+    movie(3, "Heat", 1995, 8.3, [80, 18], popularity=50),
+    movie(4, "Heathers", 1989, 7.1, [35], popularity=20),
+    person_doc({"member_id": 1, "name": "Keanu Reeves", "popularity": 90}),
+]
+
+
+def write_base(tmp_path, docs=BASE):
+    path = str(tmp_path / "search_index.bin")
+    index = SearchIndex()
+    index.upsert(docs)
+    write_arrays(path, *index.merged_arrays())
+    return path
+
+
+def keys(results):
+    return [key for key, _ in results]
+
+
+def test_replace_through_log_then_compact(tmp_path):
+    path = write_base(tmp_path)
+    append_updates(path, [movie(2, "The Matrix Reloaded", 2003, 7.2, [28, 878], popularity=60)])
+
+    index, replayed = open_index(path)
+    assert replayed == os.path.getsize(log_path(path))
+    assert len(index) == len(BASE)
+    assert keys(index.search("matrix reloaded", kind=MOVIE))[0] == doc_key(MOVIE, 2)
+    assert doc_key(MOVIE, 2) not in keys(index.search("revolutions"))
+    assert index.lookup(doc_key(MOVIE, 2))["name"] == "The Matrix Reloaded"
+
+    compact(path)
+    assert os.path.getsize(log_path(path)) == 0
+    index, replayed = open_index(path)
+    assert replayed == 0 and not index.docs
+    assert len(index) == len(BASE)
+    assert keys(index.search("matrix reloaded", kind=MOVIE))[0] == doc_key(MOVIE, 2)
+    assert doc_key(MOVIE, 2) not in keys(index.search("revolutions"))
+    assert index.lookup(doc_key(MOVIE, 2)) == {"kind": "movie", "id": 2, "name": "The Matrix Reloaded", "year": 2003}
+
+
+def test_facets_cover_base_and_logged_docs(tmp_path):
+    path = write_base(tmp_path)
+    append_updates(path, [
+        movie(5, "Heat Wave", 1995, 6.0, [80]),
+        movie(6, "Heat Lightning", 1995, 7.5, [80, 99]),
+        movie(7, "Heatstroke", 2013, 8.0, [80]),
+        movie(8, "Heat Signature", 1995, 9.0, [10770]),  # a genre the base file has never seen
+    ])
+    index, _ = open_index(path)
+
+    assert sorted(keys(index.search("heat", genres=[80], year=1995, min_rating=7, limit=50))) == [
+        doc_key(MOVIE, 3), doc_key(MOVIE, 6)
+    ]
+    assert keys(index.search("heat", genres=[10770], limit=50)) == [doc_key(MOVIE, 8)]
+    # any of the genres matches, whether the doc is mapped or logged
+    assert sorted(keys(index.search("heat", genres=[99, 35], limit=50))) == [doc_key(MOVIE, 4), doc_key(MOVIE, 6)]
+    assert index.search("heat", genres=[12345]) == []
+    assert index.search("heat", year=1995, min_rating=9.5) == []
+
+
+def test_prefix_completion_after_compaction(tmp_path):
+    path = write_base(tmp_path)
+    append_updates(path, [
+        movie(2, "The Matrix Reloaded", 2003, 7.2, [28, 878], popularity=60),
+        person_doc({"member_id": 2, "name": "Carrie-Anne Moss", "popularity": 70}),
+    ])
+    compact(path)
+    index, _ = open_index(path)
+    assert not index.docs
+
+    assert index.complete("mat") == [(doc_key(MOVIE, 1), "The Matrix"), (doc_key(MOVIE, 2), "The Matrix Reloaded")]
+    assert index.complete("reloa") == [(doc_key(MOVIE, 2), "The Matrix Reloaded")]
+    assert index.complete("revol") == []
+    assert index.complete("heat") == [(doc_key(MOVIE, 3), "Heat"), (doc_key(MOVIE, 4), "Heathers")]
+    assert index.complete("mo", kind=PERSON) == [(doc_key(PERSON, 2), "Carrie-Anne Moss")]
+    assert index.complete("the", limit=1) == [(doc_key(MOVIE, 1), "The Matrix")]
+
+
+def test_live_index_follows_log_and_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr("search_index.SEARCH_REFRESH_SECONDS", 0)
+    path = str(tmp_path / "search_index.bin")
+    live = LiveSearchIndex(path)
+    assert live.current() is None
+
+    append_updates(path, BASE)
+    assert len(live.current()) == len(BASE)
+    append_updates(path, [movie(9, "Heat 2", 2026, 0, [80])])
+    assert doc_key(MOVIE, 9) in keys(live.current().search("heat 2"))
+
+    compact(path)
+    index = live.current()
+    assert not index.docs and len(index) == len(BASE) + 1
+    assert doc_key(MOVIE, 9) in keys(index.search("heat 2"))
@@ -0,0 +1,95 @@
+import pytest
+import user_context
+from chat_cache import DiskCache
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+
+    def fetch(user_id):
+        calls.append(user_id)
+        return {"user": {"username": user_id}, "fetch": len(calls)}
+
+    monkeypatch.setattr(user_context, "fetch_user_context", fetch)
+    return calls
+
+
+def as_worker(monkeypatch, path):
+    # every gunicorn worker opens its own connection to the same file
+    monkeypatch.setattr(user_context, "context_cache", DiskCache(str(path), 60, table="user_context"))
+
+
+def test_context_is_cached(tmp_path, monkeypatch, fetches):
+    as_worker(monkeypatch, tmp_path / "context.db")
+    assert user_context.get_user_context("u1")["fetch"] == 1
+    assert user_context.get_user_context("u1")["fetch"] == 1
+    assert fetches == ["u1"]
+
+
+def test_invalidate_reaches_every_worker(tmp_path, monkeypatch, fetches):
+    path = tmp_path / "context.db"
+    as_worker(monkeypatch, path)
+    user_context.get_user_context("u1")
+    user_context.get_user_context("u2")
+
+    as_worker(monkeypatch, path)
+    assert user_context.get_user_context("u1")["fetch"] == 1  # filled by the first worker
+    user_context.invalidate_user_context("u1")
+
+    as_worker(monkeypatch, path)
+    assert user_context.get_user_context("u1")["fetch"] == 3
+    assert user_context.get_user_context("u2")["fetch"] == 2
+
+
+def turn(role, content):
+    return {"role": role, "content": content}
+
+
+def test_trim_keeps_everything_within_budget():
+    messages = [turn("system", "base"), turn("user", "hi"), turn("assistant", "hello")]
+    assert user_context.trim_messages(messages, budget=10_000) == messages
+
+
+def test_trim_drops_oldest_turns_past_the_budget(monkeypatch):
+    monkeypatch.setattr(user_context, "SUMMARY_MAX_CHARS", 300)
+    # each turn costs 100 // 4 + 4 = 29 tokens, the system message 5 and the summary reserve 75
+    messages = [turn("system", "base")] + [turn("user" if i % 2 == 0 else "assistant", f"{i}" * 100) for i in range(6)]
+    trimmed = user_context.trim_messages(messages, budget=5 + 75 + 29 * 2)
+    assert trimmed[0] == messages[0]
+    assert trimmed[2:] == messages[5:]
+    summary = trimmed[1]
+    assert summary["role"] == "system"
+    # the dropped user questions, most recent first, assistant replies aren't summarized
+    assert summary["content"].index("2" * 100) < summary["content"].index("0" * 100)
+    assert "1" * 100 not in summary["content"] and "3" * 100 not in summary["content"]
+
+
+def test_summary_stops_at_its_size(monkeypatch):
+    monkeypatch.setattr(user_context, "SUMMARY_MAX_CHARS", 300)
+    questions = [turn("user", f"{i}" * 100) for i in range(5)]
+    summary = user_context.summarize(questions)
+    assert len(summary) <= 300
+    assert "4" * 100 in summary and "3" * 100 in summary and "2" * 100 not in summary
+
+
+def test_trim_keeps_the_latest_turn_even_if_it_alone_is_over_budget():
+    messages = [turn("user", "old"), turn("user", "x" * 10_000)]
+    trimmed = user_context.trim_messages(messages, budget=10)
+    assert trimmed[-1] == messages[-1]
+    assert len(trimmed) == 2 and trimmed[0]["role"] == "system"
+
+
+def test_trim_leaves_messages_in_place():
+    messages = [
+        turn("system", "base"), turn("user", "a" * 400), turn("assistant", "b" * 400),
+        turn("system", "context"), turn("user", "c"), turn("assistant", "d"),
+    ]
+    trimmed = user_context.trim_messages(messages, budget=user_context.SUMMARY_MAX_CHARS // 4 + 40)
+    assert [m["content"] for m in trimmed[2:]] == ["context", "c", "d"]
+    assert trimmed[0] == messages[0] and trimmed[1]["content"].startswith("Earlier in this conversation")
+
+
+def test_trim_skips_entries_that_arent_messages():
+    messages = [turn("system", "base"), "hello", None, turn("user", "hi")]
+    assert user_context.trim_messages(messages) == [messages[0], messages[3]]
@@ -0,0 +1,207 @@
+import os
+import logging
+import threading
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from chat_cache import DiskCache, LRUCache
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_API_KEY = os.environ.get("SUPABASE_API_KEY")
+
+CONTEXT_CACHE_SIZE = int(os.environ.get("CONTEXT_CACHE_SIZE", "1024"))
+CONTEXT_CACHE_PATH = os.environ.get("CONTEXT_CACHE_PATH", "user_context_cache.db")  # sqlite file shared by every worker
+CONTEXT_CACHE_TTL = float(os.environ.get("CONTEXT_CACHE_TTL", "300"))  # seconds, writes also invalidate
+CONTEXT_MAX_WATCHED = int(os.environ.get("CONTEXT_MAX_WATCHED", "25"))  # most recent titles sent upstream
+CONTEXT_MAX_PLAYLISTS = int(os.environ.get("CONTEXT_MAX_PLAYLISTS", "20"))
+CONTEXT_RECOMMENDATIONS = int(os.environ.get("CONTEXT_RECOMMENDATIONS", "5"))
+CHAT_TOKEN_BUDGET = int(os.environ.get("CHAT_TOKEN_BUDGET", "6000"))  # prompt budget, leaves room for the reply
+SUMMARY_MAX_CHARS = int(os.environ.get("SUMMARY_MAX_CHARS", "600"))
+
+supabase = None
+supabase_lock = threading.Lock()
+context_cache = None
+context_cache_lock = threading.Lock()
+token_cache = LRUCache(CONTEXT_CACHE_SIZE, 60)  # access token -> user id
+executor = ThreadPoolExecutor(max_workers=4)
+
+
+def get_supabase():
+    # created on first use so the proxy still starts without database credentials
+    global supabase
+    with supabase_lock:
+        if supabase is None:
+            from supabase import create_client
+            supabase = create_client(SUPABASE_URL, SUPABASE_API_KEY)
+    return supabase
+
+
+def user_id_from_token(token):
+    # the browser sends its Supabase access token, we never trust a user id from the body
+    user_id = token_cache.get(token)
+    if user_id is None:
+        try:
+            res = get_supabase().auth.get_user(token)
+        except Exception as e:
+            logging.warning(f"Rejected access token ({e})")
+            return None
+        user_id = res.user.id if res and res.user else None
+        if user_id is None:
+            return None
+        token_cache.set(token, user_id)
+    return user_id
+
+
+def get_context_cache():
+    # on disk rather than per process, so an invalidation reaches every worker
+    global context_cache
+    with context_cache_lock:
+        if context_cache is None:
+            context_cache = DiskCache(CONTEXT_CACHE_PATH, CONTEXT_CACHE_TTL, table="user_context")
+    return context_cache
+
+
+def get_user_context(user_id):
+    cache = get_context_cache()
+    context = cache.get(user_id)
+    if context is None:
+        context = fetch_user_context(user_id)
+        cache.set(user_id, context)
+    return context
+
+
+def invalidate_user_context(user_id):
+    get_context_cache().delete(user_id)
+
+
+def fetch_user_context(user_id):
+    # user, playlists, watched history and preferences in one embedded query
+    client = get_supabase()
+    user = client.table("user").select(
+        "username, name, bio, date_of_birth, "
+        "playlists(name, playlist_id), "
+        "watched_movies(movie_id, watch_date, movie(title)), "
+        "user_genre_prefs(genre_id, watch_count, genre(name)), "
+        "user_actor_prefs(actor_id, watch_count, crew_member(name))"
+    ).eq("id", user_id).single().execute().data
+
+    watched = sorted(user.pop("watched_movies") or [], key=lambda w: w.get("watch_date") or "", reverse=True)
+    playlists = sorted(user.pop("playlists") or [], key=lambda p: p["playlist_id"], reverse=True)
+    top_genre = max(user.pop("user_genre_prefs") or [], key=lambda p: p["watch_count"], default=None)
+    top_actor = max(user.pop("user_actor_prefs") or [], key=lambda p: p["watch_count"], default=None)
+
+    # genre and actor recommendations don't depend on each other, fetch them together
+    watched_ids = {w["movie_id"] for w in watched}
+    futures = []
+    if top_genre:
+        futures.append(executor.submit(top_movies_for, "movie_genre", "genre_id", top_genre["genre_id"], watched_ids))
+    if top_actor:
+        futures.append(executor.submit(top_movies_for, "movie_actor", "actor_id", top_actor["actor_id"], watched_ids))
+    recommended = {}
+    for future in futures:
+        for movie in future.result():
+            recommended.setdefault(movie["movie_id"], movie)
+    recommended = sorted(recommended.values(), key=lambda m: m.get("popularity") or 0, reverse=True)
+
+    return {
+        "user": user,
+        "playlists": [p["name"] for p in playlists],
+        "watched": [w["movie"]["title"] for w in watched if w.get("movie")],
+        "most_watched_genre": (top_genre.get("genre") or {}).get("name") if top_genre else None,
+        "most_watched_actor": (top_actor.get("crew_member") or {}).get("name") if top_actor else None,
+        "recommended": [m["title"] for m in recommended[:CONTEXT_RECOMMENDATIONS]],
+    }
+
+
+def top_movies_for(link_table, column, value, exclude_ids):
+    # most popular movies linked to a genre or actor, ordered and limited by the database
+    res = get_supabase().table("movie").select(
+        f"movie_id, title, popularity, {link_table}!inner({column})"
+    ).eq(f"{link_table}.{column}", value).order("popularity", desc=True).limit(
+        CONTEXT_RECOMMENDATIONS + min(len(exclude_ids), 200)
+    ).execute()
+    return [m for m in res.data if m["movie_id"] not in exclude_ids]
+
+
+def age_from(date_of_birth):
+    if not date_of_birth:
+        return "N/A"
+    born = date.fromisoformat(date_of_birth[:10])
+    today = date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def build_context_prompt(context):
+    # same shape as the prompt Chatbot.jsx used to build, capped to the most recent titles
+    user = context["user"]
+    watched = context["watched"]
+    watched_titles = ", ".join(watched[:CONTEXT_MAX_WATCHED]) or "none"
+    if len(watched) > CONTEXT_MAX_WATCHED:
+        watched_titles += f" (most recent {CONTEXT_MAX_WATCHED} of {len(watched)})"
+    playlists = ", ".join(context["playlists"][:CONTEXT_MAX_PLAYLISTS]) or "none"
+    return (
+        f"User info: username: {user.get('username') or 'Unknown'}, name: {user.get('name') or 'Unknown'}, "
+        f"age: {age_from(user.get('date_of_birth'))}, date of birth: {user.get('date_of_birth') or 'N/A'}\n"
+        f"Bio: {user.get('bio') or 'No bio provided.'}\n"
+        f"Playlists: {playlists}\n"
+        f"Watched movies: {watched_titles}\n"
+        f"Most watched genre: {context['most_watched_genre'] or 'Not enough data'}\n"
+        f"Most watched actor: {context['most_watched_actor'] or 'Not enough data'}\n"
+        f"Recommended movies (based on your favorite genre and actor): {', '.join(context['recommended']) or 'none'}"
+    )
+
+
+def estimate_tokens(message):
+    # ~4 characters per token plus per-message overhead, close enough for budgeting
+    return len(message.get("content") or "") // 4 + 4
+
+
+def summarize(messages):
+    # rolling summary of turns that no longer fit, built from what the user asked
+    questions = [" ".join((m.get("content") or "").split())[:100] for m in messages if m.get("role") == "user"]
+    summary = "Earlier in this conversation the user asked about: "
+    for question in reversed(questions):
+        if len(summary) + len(question) + 4 > SUMMARY_MAX_CHARS:
+            break
+        summary += f'"{question}"; '
+    return summary.rstrip("; ")
+
+
+def trim_messages(messages, budget=CHAT_TOKEN_BUDGET):
+    # keep every system message and as many recent turns as fit, older turns become a summary
+    # nothing is reordered, the summary takes the place of the first dropped turn
+    messages = [m for m in messages if isinstance(m, dict)]
+    turns = [i for i, m in enumerate(messages) if m.get("role") != "system"]
+    used = sum(estimate_tokens(m) for m in messages if m.get("role") == "system") + SUMMARY_MAX_CHARS // 4
+    kept = 0
+    for i in reversed(turns):
+        cost = estimate_tokens(messages[i])
+        if kept and used + cost > budget:
+            break
+        kept += 1
+        used += cost
+    dropped = set(turns[:len(turns) - kept])
+    if not dropped:
+        return messages
+    trimmed = []
+    for i, message in enumerate(messages):
+        if i == turns[0]:
+            trimmed.append({"role": "system", "content": summarize([messages[j] for j in sorted(dropped)])})
+        if i not in dropped:
+            trimmed.append(message)
+    return trimmed
+
+
+def with_user_context(messages, token):
+    # insert the server-built context after the base system prompt
+    if not token:
+        return messages
+    try:
+        user_id = user_id_from_token(token)
+        if user_id is None:
+            return messages
+        context_message = {"role": "system", "content": build_context_prompt(get_user_context(user_id))}
+    except Exception as e:
+        logging.warning(f"Couldn't build user context, continuing without it ({e})")
+        return messages
+    split = 1 if messages and messages[0].get("role") == "system" else 0
+    return messages[:split] + [context_message] + messages[split:]
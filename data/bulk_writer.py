@@ -0,0 +1,175 @@
+import io
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from tmdb import backoff_delay
+
+WRITE_CHUNK_SIZE = int(os.getenv("WRITE_CHUNK_SIZE", "500"))  # rows per request
+WRITE_WORKERS = int(os.getenv("WRITE_WORKERS", "4"))  # chunks in flight
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "3"))
+DEAD_LETTER_PATH = os.getenv("DEAD_LETTER_PATH", "dead_letter.jsonl")
+
+# conflict key of every table the importer writes
+TABLE_KEYS = {
+    "movie": ("movie_id",),
+    "crew_member": ("member_id",),
+    "movie_genre": ("movie_id", "genre_id"),
+    "movie_actor": ("movie_id", "actor_id"),
+}
+
+
+def is_data_error(error):
+    # a constraint or data violation (SQLSTATE class 22/23) or any other 4xx is down to the rows,
+    # connection errors and 5xx are down to the database and look the same for every row
+    code = str(getattr(error, "pgcode", None) or getattr(error, "code", None) or "")
+    if code[:2] in ("22", "23"):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None) or getattr(error, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500
+
+
+class SupabaseWriter:
+    def __init__(self, client):
+        self.client = client
+
+    def upsert(self, table, rows):
+        self.client.table(table).upsert(rows).execute()
+
+
+class PostgresCopyWriter:
+    # COPY each chunk into a temp table and merge it, much faster than REST upserts
+    # for the initial backfill against a plain Postgres (or a local stand-in)
+    def __init__(self, dsn, pool_size=WRITE_WORKERS):
+        from psycopg2.pool import ThreadedConnectionPool
+        self.pool = ThreadedConnectionPool(1, pool_size, dsn)
+
+    def upsert(self, table, rows):
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        keys = TABLE_KEYS[table]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)  # unquoted empty field == NULL
+        for row in rows:
+            writer.writerow([row.get(column) for column in columns])
+        buffer.seek(0)
+
+        column_list = ", ".join(columns)
+        updates = [f"{c} = EXCLUDED.{c}" for c in columns if c not in keys]
+        on_conflict = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE staging ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA")
+                cur.copy_expert(f"COPY staging ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cur.execute(
+                    f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM staging "
+                    f"ON CONFLICT ({', '.join(keys)}) {on_conflict}"
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+
+class BulkWriter:
+    # writes tables in stages, chunks of one stage go out concurrently
+    # rows that still fail after retries are appended to the dead-letter file, never dropped
+    def __init__(self, backend, chunk_size=WRITE_CHUNK_SIZE, workers=WRITE_WORKERS,
+                 max_retries=WRITE_MAX_RETRIES, dead_letter_path=DEAD_LETTER_PATH):
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self.dead_letter_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def write_stage(self, tables):
+        # tables: {table: rows}, returns {table: failed rows}
+        futures = []
+        for table, rows in tables.items():
+            for i in range(0, len(rows), self.chunk_size):
+                futures.append((table, self.executor.submit(self.write_chunk, table, rows[i:i + self.chunk_size])))
+        failed = {table: [] for table in tables}
+        for table, future in futures:
+            failed[table].extend(future.result())
+        return failed
+
+    def write_chunk(self, table, rows):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.backend.upsert(table, rows)
+                return []
+            except Exception as e:
+                error = e
+                if is_data_error(e):
+                    break  # the same rows fail the same way, no point retrying
+                if attempt < self.max_retries:
+                    delay = backoff_delay(attempt)
+                    logging.warning(f"Writing {len(rows)} {table} rows failed, retrying in {delay:.2f}s ({e})")
+                    time.sleep(delay)
+
+        # isolate the bad rows so one poisoned row doesn't sink the whole chunk,
+        # during an outage splitting would only multiply the failing requests
+        if len(rows) > 1 and is_data_error(error):
+            mid = len(rows) // 2
+            return self.write_isolated(table, rows[:mid]) + self.write_isolated(table, rows[mid:])
+        self.dead_letter(table, rows, error)
+        return rows
+
+    def write_isolated(self, table, rows):
+        try:
+            self.backend.upsert(table, rows)
+            return []
+        except Exception as e:
+            if len(rows) == 1 or not is_data_error(e):
+                self.dead_letter(table, rows, e)
+                return rows
+            mid = len(rows) // 2
+            return self.write_isolated(table, rows[:mid]) + self.write_isolated(table, rows[mid:])
+
+    def dead_letter(self, table, rows, reason):
+        logging.error(f"Dead-lettering {len(rows)} {table} rows ({reason})")
+        at = datetime.now(timezone.utc).isoformat()
+        with self.dead_letter_lock, open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({"table": table, "row": row, "error": str(reason), "at": at}) + "\n")
+
+    def replay_dead_letter(self):
+        # retry everything in the dead-letter file, rows that fail again are written back
+        # returns how many rows are still failing
+        replay_path = f"{self.dead_letter_path}.replaying"
+        if not os.path.exists(self.dead_letter_path) and not os.path.exists(replay_path):
+            return 0
+        # a leftover .replaying file means a previous replay was interrupted, finish that one first
+        if not os.path.exists(replay_path):
+            os.replace(self.dead_letter_path, replay_path)
+        tables = {}
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    tables.setdefault(entry["table"], []).append(entry["row"])
+        # parents before children so foreign keys resolve
+        still_failing = 0
+        for stage in (("movie", "crew_member"), ("movie_genre", "movie_actor")):
+            failed = self.write_stage({table: tables.pop(table) for table in stage if table in tables})
+            still_failing += sum(len(rows) for rows in failed.values())
+        if tables:
+            failed = self.write_stage(tables)
+            still_failing += sum(len(rows) for rows in failed.values())
+        os.remove(replay_path)
+        return still_failing
+
+
+def make_writer(supabase):
+    # BULK_DATABASE_URL switches to the COPY path, e.g. for a backfill into a local Postgres
+    dsn = os.getenv("BULK_DATABASE_URL")
+    backend = PostgresCopyWriter(dsn) if dsn else SupabaseWriter(supabase)
+    return BulkWriter(backend)
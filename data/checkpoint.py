@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+
+QUERY_CHUNK = 500  # stay well under sqlite's bound parameter limit
+
+
+class CheckpointStore:
+    # durable import progress in a WAL-mode sqlite file
+    # every write is its own transaction, so a crash never leaves a half-written checkpoint
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS movie_done (movie_id INTEGER PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS person_done (member_id INTEGER PRIMARY KEY)")
+        # movies a run couldn't finish after the cursor had moved past them
+        self.conn.execute("CREATE TABLE IF NOT EXISTS movie_retry (movie_id INTEGER PRIMARY KEY, attempts INTEGER NOT NULL)")
+
+    def get(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, values):
+        # several state keys in one transaction, e.g. a cursor that must never be half updated
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO state (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    ((key, str(value)) for key, value in values.items())
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def has_movie(self, movie_id):
+        return self._has("movie_done", "movie_id", movie_id)
+
+    def has_person(self, member_id):
+        return self._has("person_done", "member_id", member_id)
+
+    def done_movies(self, movie_ids):
+        return self._done("movie_done", "movie_id", movie_ids)
+
+    def done_people(self, member_ids):
+        return self._done("person_done", "member_id", member_ids)
+
+    def mark_movies_done(self, movie_ids):
+        self._mark("movie_done", "movie_id", movie_ids)
+
+    def mark_people_done(self, member_ids):
+        self._mark("person_done", "member_id", member_ids)
+
+    def add_movie_retries(self, movie_ids):
+        # records one more failed attempt for each movie
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO movie_retry (movie_id, attempts) VALUES (?, 1) "
+                    "ON CONFLICT(movie_id) DO UPDATE SET attempts = attempts + 1",
+                    ((movie_id,) for movie_id in movie_ids)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def movie_retries(self, max_attempts):
+        # movies still owed a retry, the ones past max_attempts stay in the table for a person to look at
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT movie_id FROM movie_retry WHERE attempts < ? ORDER BY movie_id", (max_attempts,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear_movie_retries(self, movie_ids):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("DELETE FROM movie_retry WHERE movie_id = ?", ((movie_id,) for movie_id in movie_ids))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _has(self, table, column, value):
+        with self.lock:
+            row = self.conn.execute(f"SELECT 1 FROM {table} WHERE {column} = ?", (value,)).fetchone()
+        return row is not None
+
+    def _done(self, table, column, values):
+        # subset of values already recorded in table
+        values = list(values)
+        done = set()
+        with self.lock:
+            for i in range(0, len(values), QUERY_CHUNK):
+                chunk = values[i:i + QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", chunk
+                )
+                done.update(row[0] for row in rows)
+        return done
+
+    def _mark(self, table, column, values):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)",
+                    ((value,) for value in values)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
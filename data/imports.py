@@ -1,13 +1,18 @@
 import traceback
-import requests
 import time
 import os
+import sys
+import argparse
+import requests
 import logging
 import pickle
 from dotenv import load_dotenv
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from supabase import create_client, Client
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from checkpoint import CheckpointStore
+from bulk_writer import make_writer
+from tmdb import tmdb_get, backoff_delay, get_request_count, TMDB_MAX_WORKERS
 
 load_dotenv() # load env variables from .env file
 
@@ -25,12 +30,25 @@ logging.basicConfig(
 )
 
 #tmdb and supabase credentials
-TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_API_KEY = os.getenv("SUPABASE_API_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_API_KEY)
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+CHECKPOINT_PATH = os.getenv("IMPORT_CHECKPOINT_PATH", "import_checkpoint.db")
+LEGACY_PROGRESS_FILE = "progress.pkl"
+CHANGES_MAX_WINDOW = timedelta(days=14)
+DELTA_BATCH_SIZE = 20  # movies per flush, same as one discover page
+ID_LOOKUP_CHUNK = 500
+MOVIE_RETRY_ATTEMPTS = int(os.getenv("MOVIE_RETRY_ATTEMPTS", "5"))  # runs a discover movie is retried on before giving up
+RAILS_REBUILD_URL = os.getenv("RAILS_REBUILD_URL")  # e.g. http://localhost:5003/api/home/rebuild
+RAILS_REBUILD_TOKEN = os.getenv("RAILS_REBUILD_TOKEN")
+BOOTSTRAP_PAGE_SIZE = int(os.getenv("BOOTSTRAP_PAGE_SIZE", "1000"))  # match the server's max rows
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH")  # the file the backend serves /api/search from
+SEARCH_COMPACT_BYTES = int(os.getenv("SEARCH_COMPACT_BYTES", str(4 * 2 ** 20)))  # fold the update log in past this size
+
+if SEARCH_INDEX_PATH:
+    # the index format lives with the backend
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+    import search_index
 
 genders = {
     0: "unknown",
@@ -43,24 +61,64 @@ crew_members_batch = []
 movie_genres_batch_set = set()
 movie_actors_batch_set = set()
 
-res = supabase.table("language").select("lang_id").execute()
-existing_languages = set(row["lang_id"] for row in res.data)
+# connections and lookups are set up by init(), importing this module touches nothing
+supabase: Client = None
+writer = None
+checkpoint = None  # per-id completion lives on disk, nothing is held in memory between pages
+existing_languages = set()
 
-res = supabase.table("crew_member").select("member_id").execute()
-inserted_members = set(row["member_id"] for row in res.data)
+pending_people = set()  # person ids referenced on the current page that still need fetching
+missing_people = set()  # person ids TMDB no longer has, links to them are dropped
 
-def fetch_movie_details(movie_id):
-    time.sleep(0.01)  # random sleep to avoid hitting API rate limits
-    url = f"{TMDB_BASE_URL}/movie/{movie_id}?api_key={TMDB_API_KEY}&append_to_response=videos"
-    res = requests.get(url)
-    return res.json() if res.status_code == 200 else None
+def stream_ids(table, column, after=None):
+    # keyset pagination, never relies on offset or the server's row cap
+    # a short page is not the end since the server may cap below BOOTSTRAP_PAGE_SIZE
+    last = after
+    while True:
+        query = supabase.table(table).select(column).order(column).limit(BOOTSTRAP_PAGE_SIZE)
+        if last is not None:
+            query = query.gt(column, last)
+        rows = query.execute().data
+        if not rows:
+            return
+        yield [row[column] for row in rows]
+        last = rows[-1][column]
+
+def bootstrap_members(full=False):
+    # copy crew_member ids into the checkpoint, resuming after the last id seen on a previous run
+    after = None if full else checkpoint.get("members_bootstrap_cursor")
+    total = 0
+    for ids in stream_ids("crew_member", "member_id", int(after) if after is not None else None):
+        checkpoint.mark_people_done(ids)
+        checkpoint.set("members_bootstrap_cursor", ids[-1])
+        total += len(ids)
+    logging.warning(f"Bootstrapped {total} crew member ids")
+
+def init(full_bootstrap=False):
+    global supabase, writer, checkpoint, existing_languages
+    if supabase is not None:
+        return
+    supabase = create_client(SUPABASE_URL, SUPABASE_API_KEY)
+    writer = make_writer(supabase)
+    checkpoint = CheckpointStore(CHECKPOINT_PATH)
+    existing_languages = {lang for ids in stream_ids("language", "lang_id") for lang in ids}
+    check_schema()
+    bootstrap_members(full_bootstrap)
+
+def check_schema():
+    # a missing column fails every upsert, which would dead-letter the whole catalogue row by row
+    try:
+        supabase.table("movie").select("movie_id, backdrop_path").limit(1).execute()
+    except Exception as e:
+        raise SystemExit(f"movie.backdrop_path is missing, run data/migrations/001_movie_backdrop_path.sql first ({e})")
 
-def get_movie_certification(movie_id):
-    url = f"https://api.themoviedb.org/3/movie/{movie_id}/release_dates"
-    params = {"api_key": TMDB_API_KEY}
-    res = requests.get(url, params=params).json()
+def fetch_movie_details(movie_id):
+    # one round-trip for details, trailer, cast/crew and certification
+    # rate limiting and retries are handled by tmdb_get
+    return tmdb_get(f"/movie/{movie_id}", {"append_to_response": "videos,credits,release_dates"})
 
-    for country in res.get("results", []):
+def get_movie_certification(movie):
+    for country in movie.get("release_dates", {}).get("results", []):
         if country["iso_3166_1"] == "US":
             for release in country["release_dates"]:
                 cert = release.get("certification")
@@ -68,194 +126,290 @@ def get_movie_certification(movie_id):
                     return cert
     return "NR"
 
-def fetch_credits(movie_id):
-    url = f"{TMDB_BASE_URL}/movie/{movie_id}/credits?api_key={TMDB_API_KEY}"
-    res = requests.get(url)
-    return res.json() if res.status_code == 200 else None
+def get_trailer_key(movie):
+    for video in movie.get("videos", {}).get("results", []):
+        if video["site"] == "YouTube" and video["type"] == "Trailer":
+            return video["key"]
+    return None
 
 def fetch_person(person_id):
-    url = f"{TMDB_BASE_URL}/person/{person_id}?api_key={TMDB_API_KEY}"
-    res = requests.get(url)
-    return res.json() if res.status_code == 200 else None
+    return tmdb_get(f"/person/{person_id}")
 
 def insert_movie_with_retry(movie_id):
-    while True:
-        try:
-            movie = fetch_movie_details(movie_id)
-            # print(f"movie: {movie["id"]}")
-            if not movie:
-                logging.error(f"Couldn't fetch details for {movie_id}")
-                return
-
-            credits = fetch_credits(movie_id)
-            if not credits:
-                logging.error(f"Couldn't fetch credits for {movie_id}")
-                return
-            # print(f"credits gotten")
-
-            trailer_key = None
-            retry_count = 0
-            max_retries = 2
-            while trailer_key is None and retry_count < max_retries:
-                for video in movie.get("videos", {}).get("results", []):
-                    if video["site"] == "YouTube" and video["type"] == "Trailer":
-                        trailer_key = video["key"]
-                        break
-                if trailer_key is None:
-                    time.sleep(0.1)
-                    movie = fetch_movie_details(movie_id)
-                    retry_count += 1
-
-            rating = get_movie_certification(movie_id)
-
-            # insert movie
-            movie_data = {
-                "movie_id": movie["id"],
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "title": movie.get("title"),
-                "synopsis": movie.get("overview"),
-                "tagline": movie.get("tagline"),
-                "budget": movie.get("budget"),
-                "release_date": movie.get("release_date"),
-                "runtime": movie.get("runtime"),
-                "status": movie.get("status"),
-                "revenue": movie.get("revenue"),
-                "popularity": movie.get("popularity"),
-                "lang_id": movie.get("original_language"),
-                "trailer_key": trailer_key,
-                "poster_path": movie.get("poster_path"),
-                "rating": rating
-            }
-            if movie_data["release_date"] == "":
-                movie_data["release_date"] = None
-            if movie_data["lang_id"] == "cn":
-                movie_data["lang_id"] = "zh"
-            if movie_data["lang_id"] == "sh":
-                movie_data["lang_id"] = "sr"
-            if movie_data["lang_id"] not in existing_languages:
-                movie_data["lang_id"] = "en"            
-            movie_batch.append(movie_data)
-
-            # print("after supabase insert")
-            # insert genres
-            for genre in movie.get("genres", []):
-                movie_genres_batch_set.add((movie["id"], genre["id"]))
-
-            # print("after genre insert")
-            # insert cast members
-            for cast_member in credits.get("cast", [])[:50]:  # limit top 20 actors
-                actor_id = cast_member["id"]
-                if actor_id not in inserted_members:
-                    person = fetch_person(actor_id)
-                    if person:
-                        crew_data = {
-                            "member_id": person["id"],
-                            "name": person.get("name"),
-                            "biography": person.get("biography"),
-                            "death_date": person.get("deathday"),
-                            "birthday": person.get("birthday"),
-                            "place_of_birth": person.get("place_of_birth"),
-                            "profile_url": person.get("profile_path"),
-                            "popularity": person.get("popularity"),
-                            "known_for": person.get("known_for_department"),
-                            "gender": genders.get(person.get("gender", 0), "unknown")
-                        }
-                        crew_members_batch.append(crew_data)
-                        movie_actors_batch_set.add((movie["id"], actor_id))
-                else:
-                    # insert into movie-actor
-                    movie_actors_batch_set.add((movie["id"], actor_id))
-
-            # print("after cast insert")
-            # insert director
-            for crew_member in credits.get("crew", []):
-                if crew_member.get("job") == "Director":
-                    director_id = crew_member["id"]
-                    if director_id not in inserted_members:
-                        person = fetch_person(director_id)
-                        if person:
-                            crew_data = {
-                                "member_id": person["id"],
-                                "name": person.get("name"),
-                                "biography": person.get("biography"),
-                                "death_date": person.get("deathday"),
-                                "birthday": person.get("birthday"),
-                                "place_of_birth": person.get("place_of_birth"),
-                                "profile_url": person.get("profile_path"),
-                                "popularity": person.get("popularity"),
-                                "known_for": person.get("known_for_department"),
-                                "gender": genders.get(person.get("gender", 0), "unknown")
-                            }
-                            crew_members_batch.append(crew_data)
-                            movie_actors_batch_set.add((movie["id"], director_id))
-
-                    else:
-                        # insert into movie-actor
-                        movie_actors_batch_set.add((movie["id"], director_id))
-
-                    break
-            # print("after director insert")
-            break  # finished successfully
-        except Exception as e:
-            logging.error(f"Network error movie {movie_id}, retrying... ({str(e)})")
-            time.sleep(0.1)
+    # retries and backoff live in tmdb_get, an exception here means they are used up
+    # returns True once the movie is queued for writing, None if TMDB has nothing to import
+    # and False when the movie has to be tried again on a later run
+    try:
+        movie = fetch_movie_details(movie_id)
+    except Exception as e:
+        logging.error(f"Giving up on movie {movie_id} ({str(e)})")
+        return False
+    # print(f"movie: {movie["id"]}")
+    if not movie:
+        logging.error(f"Couldn't fetch details for {movie_id}")
+        return
+
+    credits = movie.get("credits")
+    if not credits:
+        logging.error(f"Couldn't fetch credits for {movie_id}")
+        return
+    # print(f"credits gotten")
+
+    # insert movie
+    movie_data = {
+        "movie_id": movie["id"],
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "title": movie.get("title"),
+        "synopsis": movie.get("overview"),
+        "tagline": movie.get("tagline"),
+        "budget": movie.get("budget"),
+        "release_date": movie.get("release_date"),
+        "runtime": movie.get("runtime"),
+        "status": movie.get("status"),
+        "revenue": movie.get("revenue"),
+        "popularity": movie.get("popularity"),
+        "lang_id": movie.get("original_language"),
+        "trailer_key": get_trailer_key(movie),
+        "poster_path": movie.get("poster_path"),
+        "backdrop_path": movie.get("backdrop_path"),
+        "vote_avg": movie.get("vote_average"),
+        "rating": get_movie_certification(movie)
+    }
+    if movie_data["release_date"] == "":
+        movie_data["release_date"] = None
+    if movie_data["lang_id"] == "cn":
+        movie_data["lang_id"] = "zh"
+    if movie_data["lang_id"] == "sh":
+        movie_data["lang_id"] = "sr"
+    if movie_data["lang_id"] not in existing_languages:
+        movie_data["lang_id"] = "en"            
+    movie_batch.append(movie_data)
+
+    # print("after supabase insert")
+    # insert genres
+    for genre in movie.get("genres", []):
+        movie_genres_batch_set.add((movie["id"], genre["id"]))
+
+    # print("after genre insert")
+    # cast members, people are fetched once per page in fetch_pending_people
+    for cast_member in credits.get("cast", [])[:50]:  # limit top 20 actors
+        actor_id = cast_member["id"]
+        movie_actors_batch_set.add((movie["id"], actor_id))
+        pending_people.add(actor_id)
+
+    # print("after cast insert")
+    # insert director
+    for crew_member in credits.get("crew", []):
+        if crew_member.get("job") == "Director":
+            director_id = crew_member["id"]
+            movie_actors_batch_set.add((movie["id"], director_id))
+            pending_people.add(director_id)
+            break
+    # print("after director insert")
+    return True
+
+def insert_person(person_id):
+    # returns False when the person has to be tried again on a later run
+    try:
+        person = fetch_person(person_id)
+    except Exception as e:
+        logging.error(f"Giving up on person {person_id} ({str(e)})")
+        return False
+    if not person:
+        logging.error(f"Couldn't fetch person {person_id}")
+        missing_people.add(person_id)
+        return
+    crew_data = {
+        "member_id": person["id"],
+        "name": person.get("name"),
+        "biography": person.get("biography"),
+        "death_date": person.get("deathday"),
+        "birthday": person.get("birthday"),
+        "place_of_birth": person.get("place_of_birth"),
+        "profile_url": person.get("profile_path"),
+        "popularity": person.get("popularity"),
+        "known_for": person.get("known_for_department"),
+        "gender": genders.get(person.get("gender", 0), "unknown")
+    }
+    crew_members_batch.append(crew_data)
+
+def fetch_pending_people(executor):
+    # each person referenced on the page is fetched once, however many movies they are in
+    people = list(pending_people - checkpoint.done_people(pending_people))
+    pending_people.clear()
+    futures = [executor.submit(insert_person, person_id) for person_id in people]
+    for future in as_completed(futures):
+        future.result()
+    return len(people)
 
 def flush_batches():
+    # movie and crew_member go first, the link tables only once their parents are written
     global movie_batch, movie_genres_batch_set, crew_members_batch, movie_actors_batch_set
     try:
-        # movie table: unique on movie_id
-        if movie_batch:
-            unique_movies = {m["movie_id"]: m for m in movie_batch}.values()
-            supabase.table("movie").upsert(list(unique_movies)).execute()
+        # movie table: unique on movie_id, crew_member table: unique on member_id
+        unique_movies = list({m["movie_id"]: m for m in movie_batch}.values())
+        unique_crew = list({c["member_id"]: c for c in crew_members_batch}.values())
+        failed = writer.write_stage({"movie": unique_movies, "crew_member": unique_crew})
+        failed_movies = {m["movie_id"] for m in failed["movie"]}
+        failed_crew = {c["member_id"] for c in failed["crew_member"]}
+        checkpoint.mark_people_done(c["member_id"] for c in unique_crew if c["member_id"] not in failed_crew)  # update after confirmed insert
 
         # movie_genre table: unique on (movie_id, genre_id)
-        if movie_genres_batch_set:
-            unique_movie_genres = list({(m, g) for m, g in movie_genres_batch_set})
-            supabase.table("movie_genre").upsert(
-                [{"movie_id": m, "genre_id": g} for m, g in unique_movie_genres]
-            ).execute()
-
-        # crew_member table: unique on member_id
-        if crew_members_batch:
-            unique_crew = {c["member_id"]: c for c in crew_members_batch}.values()
-            supabase.table("crew_member").upsert(list(unique_crew)).execute()
-            for crew in unique_crew:
-                inserted_members.add(crew["member_id"])  # update after confirmed insert
-
         # movie_actor table: unique on (movie_id, actor_id)
-        existing_member_ids = inserted_members
-        unique_movie_actors = [
-            {"movie_id": m, "actor_id": a}
-            for m, a in movie_actors_batch_set
-            if a in existing_member_ids
-        ]
-        if unique_movie_actors:
-            supabase.table("movie_actor").upsert(unique_movie_actors).execute()
+        existing_member_ids = checkpoint.done_people({a for _, a in movie_actors_batch_set})
+        movie_genres, movie_actors = [], []
+        orphan_genres, orphan_actors = [], []
+        dropped_actors, unfetched_actors = [], []
+        for m, g in movie_genres_batch_set:
+            row = {"movie_id": m, "genre_id": g}
+            (orphan_genres if m in failed_movies else movie_genres).append(row)
+        for m, a in movie_actors_batch_set:
+            row = {"movie_id": m, "actor_id": a}
+            if m in failed_movies or a in failed_crew:
+                # the parent row is dead-lettered too, replay writes it before this one
+                orphan_actors.append(row)
+            elif a in existing_member_ids:
+                movie_actors.append(row)
+            elif a in missing_people:
+                dropped_actors.append(row)
+            else:
+                # the person fetch gave up, there is no row to replay so the movie is imported again
+                unfetched_actors.append(row)
+        if orphan_genres:
+            writer.dead_letter("movie_genre", orphan_genres, "parent movie not written")
+        if orphan_actors:
+            writer.dead_letter("movie_actor", orphan_actors, "parent movie or crew_member not written")
+        if dropped_actors:
+            logging.warning(f"Dropping {len(dropped_actors)} movie_actor links to people TMDB doesn't return")
+
+        failed.update(writer.write_stage({"movie_genre": movie_genres, "movie_actor": movie_actors}))
+
+        # a movie only counts as imported once all of its rows are written
+        incomplete = failed_movies | {row["movie_id"] for row in orphan_genres + orphan_actors + unfetched_actors}
+        incomplete.update(row["movie_id"] for row in failed["movie_genre"] + failed["movie_actor"])
+        checkpoint.mark_movies_done(m["movie_id"] for m in unique_movies if m["movie_id"] not in incomplete)
+        update_search_index(
+            [m for m in unique_movies if m["movie_id"] not in incomplete],
+            [c for c in unique_crew if c["member_id"] not in failed_crew],
+            movie_genres
+        )
+        return not incomplete and not failed_crew
 
     except Exception as e:
-        logging.error(f"Error flushing batches: {str(e)}")
+        logging.error(f"Error flushing batches: {str(e)}\n{traceback.format_exc()}")
+        writer.dead_letter("movie", movie_batch, e)
+        writer.dead_letter("crew_member", crew_members_batch, e)
+        writer.dead_letter("movie_genre", [{"movie_id": m, "genre_id": g} for m, g in movie_genres_batch_set], e)
+        writer.dead_letter("movie_actor", [{"movie_id": m, "actor_id": a} for m, a in movie_actors_batch_set], e)
+        return False
     finally:
         movie_batch.clear()
         movie_genres_batch_set.clear()
         crew_members_batch.clear()
         movie_actors_batch_set.clear()
+        missing_people.clear()
 
 
-def main():
-    global inserted_members, movie_genres_batch_set, movie_actors_batch_set
-    with open("progress.pkl", "rb") as f:
-        data = pickle.load(f)
-        year = data["year"]
-        page = data["page"]
-        movie_genres_batch_set = data["movie_genres_batch_set"]
-        movie_actors_batch_set = data["movie_actors_batch_set"]
+def update_search_index(movies, crew, genre_rows):
+    # written rows go to the index's update log, the backend applies them within a second
+    if not SEARCH_INDEX_PATH:
+        return
+    try:
+        genres = {}
+        for row in genre_rows:
+            genres.setdefault(row["movie_id"], []).append(row["genre_id"])
+        docs = [search_index.movie_doc(m, genres.get(m["movie_id"], [])) for m in movies]
+        docs += [search_index.person_doc(c) for c in crew]
+        search_index.append_updates(SEARCH_INDEX_PATH, docs)
+        if os.path.getsize(search_index.log_path(SEARCH_INDEX_PATH)) > SEARCH_COMPACT_BYTES:
+            search_index.compact(SEARCH_INDEX_PATH)
+    except Exception as e:
+        # the database is the source of truth, `python search_index.py --build` catches the index up
+        logging.error(f"Updating the search index failed ({e})")
 
+def compact_search_index():
+    if not SEARCH_INDEX_PATH:
+        return
+    try:
+        search_index.compact(SEARCH_INDEX_PATH)
+    except Exception as e:
+        logging.error(f"Compacting the search index failed ({e})")
+
+def import_movies(movie_ids, executor, label="Batch"):
+    # fetch, map and upsert a batch of movies plus any people they introduce
+    # returns the ids of movies that couldn't be fetched or fully written, empty on success
+    requests_before = get_request_count()
+    futures = {executor.submit(insert_movie_with_retry, movie_id): movie_id for movie_id in movie_ids}
+    queued, failed = [], []
+    for future in as_completed(futures):
+        # print("some future")
+        result = future.result()
+        if result is False:
+            failed.append(futures[future])
+        elif result:
+            queued.append(futures[future])
+    people_fetched = fetch_pending_people(executor)
+
+    flush_batches()
+    # flush_batches only marks a movie done once every one of its rows is written
+    done = checkpoint.done_movies(queued)
+    failed += [movie_id for movie_id in queued if movie_id not in done]
+    batch_requests = get_request_count() - requests_before
+    logging.warning(
+        f"{label}: {len(movie_ids)} movies, {people_fetched} people, "
+        f"{batch_requests} TMDB requests ({batch_requests / max(len(movie_ids), 1):.2f} per movie)"
+    )
+    if failed:
+        logging.error(f"{label}: {len(failed)} movies couldn't be imported: {sorted(failed)}")
+    return failed
+
+def refresh_people(person_ids, executor):
+    # re-fetch people we already store, e.g. after a TMDB person change
+    futures = [executor.submit(insert_person, person_id) for person_id in person_ids]
+    failed_fetches = 0
+    for future in as_completed(futures):
+        if future.result() is False:
+            failed_fetches += 1
+    return flush_batches() and not failed_fetches
+
+def load_cursor():
+    # discover crawl position, falling back to a legacy progress.pkl once
+    year = checkpoint.get("discover_year")
+    page = checkpoint.get("discover_page")
+    if year is not None and page is not None:
+        return int(year), int(page)
+    if os.path.exists(LEGACY_PROGRESS_FILE):
+        try:
+            with open(LEGACY_PROGRESS_FILE, "rb") as f:
+                data = pickle.load(f)
+            return data["year"], data["page"]
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable {LEGACY_PROGRESS_FILE} ({e})")
+    return datetime.now(timezone.utc).year, 1
+
+def save_cursor(year, page):
+    checkpoint.set_many({"discover_year": year, "discover_page": page})
+
+def retry_failed_movies():
+    # movies an earlier run couldn't finish, each gets MOVIE_RETRY_ATTEMPTS runs before it is left for a person to look at
+    movie_ids = checkpoint.movie_retries(MOVIE_RETRY_ATTEMPTS)
+    if not movie_ids:
+        return
+    logging.warning(f"Retrying {len(movie_ids)} movies from earlier runs")
+    with ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS) as executor:
+        failed = set(import_ids(movie_ids, executor))
+    checkpoint.clear_movie_retries(m for m in movie_ids if m not in failed)
+    checkpoint.add_movie_retries(failed)
+
+def run_discover():
+    retry_failed_movies()
+    year, page = load_cursor()
 
     print(f"Starting from year {year}, page {page}")
     min_year = 1930
     max_pages = 2
-    max_workers = 5
-    
+    failures = 0
+
     while year >= min_year:
         # print(f"year: {year}, page: {page}")
         if page > max_pages:
@@ -263,10 +417,9 @@ def main():
             page = 1
             continue
         try:
-            res = requests.get(
-                f"{TMDB_BASE_URL}/discover/movie",
-                params={
-                    "api_key": TMDB_API_KEY,
+            res = tmdb_get(
+                "/discover/movie",
+                {
                     "primary_release_year": year,
                     "sort_by": "popularity.desc",
                     "page": page,
@@ -274,39 +427,161 @@ def main():
                 }
             )
             # print(f"res: {res}")
-            if res.status_code != 200:
-                logging.error(f"Failed to fetch year {year}, page {page}")
+            if res is None:
+                logging.error(f"Failed to fetch year {year}, page {page}, skipping")
+                page += 1
                 continue
 
-            results = res.json().get("results", [])
+            results = res.get("results", [])
             if not results:
                 year -= 1
                 page = 1
                 continue
             # print(f"result agaya")
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(insert_movie_with_retry, movie["id"]) for movie in results]
-                for future in as_completed(futures):
-                    # print("some future")
-                    future.result()
-
-            flush_batches()
+            # resuming a half-finished page only imports what is still missing
+            page_ids = [movie["id"] for movie in results]
+            done = checkpoint.done_movies(page_ids)
+            remaining = [movie_id for movie_id in page_ids if movie_id not in done]
+            if remaining:
+                with ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS) as executor:
+                    failed = import_movies(remaining, executor, f"Year {year}, Page {page}")
+                # the cursor moves past this page, so the next run picks these up from the checkpoint
+                checkpoint.add_movie_retries(failed)
             page += 1
 
-            with open("progress.pkl", "wb") as f:
-                pickle.dump({
-                    "year": year,
-                    "page": page,
-                    "inserted_members": inserted_members,
-                    "movie_genres_batch_set": movie_genres_batch_set,
-                    "movie_actors_batch_set": movie_actors_batch_set
-                }, f)
+            save_cursor(year, page)
             logging.warning(f"Year {year}, Page {page} in progress")
+            failures = 0
 
         except Exception as e:
-            logging.warning(f"Error fetching year {year}, page {page}, retrying... ({e})\n{traceback.format_exc()}")
-            time.sleep(0.1)
+            delay = backoff_delay(failures)
+            failures += 1
+            logging.warning(f"Error fetching year {year}, page {page}, retrying in {delay:.2f}s... ({e})\n{traceback.format_exc()}")
+            time.sleep(delay)
+
+def fetch_changed_ids(kind, start, end):
+    # walk /{kind}/changes between two dates, TMDB caps each query at 14 days
+    changed = set()
+    window_start = start
+    while window_start < end:
+        window_end = min(end, window_start + CHANGES_MAX_WINDOW)
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            res = tmdb_get(f"/{kind}/changes", {
+                "start_date": window_start.isoformat(),
+                "end_date": window_end.isoformat(),
+                "page": page,
+            })
+            if res is None:
+                raise RuntimeError(f"Couldn't fetch {kind} changes for {window_start} - {window_end}, page {page}")
+            for item in res.get("results", []):
+                if not item.get("adult"):
+                    changed.add(item["id"])
+            total_pages = res.get("total_pages", 1)
+            page += 1
+        window_start = window_end
+    return changed
+
+def existing_movie_ids(movie_ids):
+    # which of these ids are already in our catalogue
+    existing = set()
+    movie_ids = list(movie_ids)
+    for i in range(0, len(movie_ids), ID_LOOKUP_CHUNK):
+        chunk = movie_ids[i:i + ID_LOOKUP_CHUNK]
+        res = supabase.table("movie").select("movie_id").in_("movie_id", chunk).execute()
+        existing.update(row["movie_id"] for row in res.data)
+    return existing
+
+def read_watermark():
+    value = checkpoint.get("changes_watermark")
+    return date.fromisoformat(value) if value else None
+
+def write_watermark(day):
+    checkpoint.set("changes_watermark", day.isoformat())
+
+def import_ids(movie_ids, executor):
+    # returns the ids that couldn't be imported
+    movie_ids = sorted(movie_ids)
+    failed = []
+    for i in range(0, len(movie_ids), DELTA_BATCH_SIZE):
+        failed += import_movies(movie_ids[i:i + DELTA_BATCH_SIZE], executor)
+    return failed
+
+def run_changes(since=None):
+    # re-import only the movies and people TMDB reports as changed since the watermark
+    start = since or read_watermark() or (datetime.now(timezone.utc).date() - timedelta(days=1))
+    end = datetime.now(timezone.utc).date() + timedelta(days=1)  # end_date is exclusive of today otherwise
+    print(f"Importing TMDB changes from {start} to {end}")
+
+    requests_before = get_request_count()
+    changed_movies = existing_movie_ids(fetch_changed_ids("movie", start, end))
+    changed_people = checkpoint.done_people(fetch_changed_ids("person", start, end))
+    logging.warning(f"Changes since {start}: {len(changed_movies)} movies, {len(changed_people)} people")
+
+    with ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS) as executor:
+        ok = not import_ids(changed_movies, executor)
+        people = sorted(changed_people)
+        for i in range(0, len(people), DELTA_BATCH_SIZE):
+            ok = refresh_people(people[i:i + DELTA_BATCH_SIZE], executor) and ok
+
+    # only move the watermark once everything up to today has been applied,
+    # otherwise the next run asks TMDB for the same window again
+    if ok:
+        write_watermark(end - timedelta(days=1))
+    else:
+        logging.error(f"Some changes since {start} failed, leaving the watermark at {start}")
+    logging.warning(f"Delta import done, {get_request_count() - requests_before} TMDB requests")
+
+def rebuild_home_rails():
+    # refresh the backend's precomputed home page once new data has landed
+    if not RAILS_REBUILD_URL:
+        return
+    try:
+        res = requests.post(
+            RAILS_REBUILD_URL,
+            headers={"Authorization": f"Bearer {RAILS_REBUILD_TOKEN}"},
+            timeout=60
+        )
+        res.raise_for_status()
+    except requests.RequestException as e:
+        logging.error(f"Couldn't rebuild home rails ({e})")
+
+def read_ids_file(path):
+    with open(path, encoding="utf-8") as f:
+        return [int(line) for line in f.read().split() if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Import movies from TMDB into Supabase")
+    parser.add_argument("--changes", action="store_true", help="re-import movies and people changed since the stored watermark")
+    parser.add_argument("--since", type=date.fromisoformat, help="override the changes watermark (YYYY-MM-DD)")
+    parser.add_argument("--ids", help="comma separated TMDB movie ids to import")
+    parser.add_argument("--ids-file", help="file of whitespace separated TMDB movie ids to import")
+    parser.add_argument("--replay-dead-letter", action="store_true", help="retry rows that previously failed to write")
+    parser.add_argument("--full-bootstrap", action="store_true", help="re-read every crew_member id instead of resuming")
+    args = parser.parse_args()
+
+    init(args.full_bootstrap)
+
+    if args.replay_dead_letter:
+        still_failing = writer.replay_dead_letter()
+        print(f"Dead-letter replay done, {still_failing} rows still failing")
+        return
+
+    if args.ids or args.ids_file:
+        movie_ids = set()
+        if args.ids:
+            movie_ids.update(int(i) for i in args.ids.split(",") if i.strip())
+        if args.ids_file:
+            movie_ids.update(read_ids_file(args.ids_file))
+        with ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS) as executor:
+            import_ids(movie_ids, executor)
+    elif args.changes or args.since:
+        run_changes(args.since)
+    else:
+        run_discover()
+    compact_search_index()
+    rebuild_home_rails()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
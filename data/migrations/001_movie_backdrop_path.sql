@@ -0,0 +1,3 @@
+-- backdrops are stored at import time for the home page hero rail (backend/home_rails.py)
+-- run once in the Supabase SQL editor before importing with a version that writes backdrop_path
+ALTER TABLE movie ADD COLUMN IF NOT EXISTS backdrop_path text;
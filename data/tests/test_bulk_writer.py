@@ -0,0 +1,121 @@
+import json
+import pytest
+import bulk_writer
+from bulk_writer import BulkWriter
+
+
+class ConstraintError(Exception):
+    code = "23503"  # foreign_key_violation
+
+
+class ConnectionLost(Exception):
+    pass
+
+
+class FakeBackend:
+    def __init__(self, bad=(), outage=False):
+        self.bad = set(bad)
+        self.outage = outage
+        self.calls = []
+        self.written = []
+
+    def upsert(self, table, rows):
+        self.calls.append((table, [row["id"] for row in rows]))
+        if self.outage:
+            raise ConnectionLost("server closed the connection")
+        if any(row["id"] in self.bad for row in rows):
+            raise ConstraintError("violates foreign key constraint")
+        self.written.append((table, [row["id"] for row in rows]))
+
+
+def rows(*ids):
+    return [{"id": i} for i in ids]
+
+
+def read_dead_letter(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bulk_writer.time, "sleep", lambda seconds: None)
+
+
+def make(backend, tmp_path, **kwargs):
+    return BulkWriter(backend, workers=1, dead_letter_path=str(tmp_path / "dead_letter.jsonl"), **kwargs)
+
+
+def test_bad_row_is_isolated_and_dead_lettered(tmp_path):
+    backend = FakeBackend(bad={3})
+    writer = make(backend, tmp_path, chunk_size=4)
+    failed = writer.write_stage({"movie": rows(1, 2, 3, 4, 5)})
+
+    assert failed == {"movie": rows(3)}
+    assert sorted(i for _, ids in backend.written for i in ids) == [1, 2, 4, 5]
+    assert [entry["row"] for entry in read_dead_letter(writer.dead_letter_path)] == rows(3)
+    # data errors aren't retried, the first failure goes straight to bisecting
+    assert backend.calls[:2] == [("movie", [1, 2, 3, 4]), ("movie", [1, 2])]
+
+
+def test_outage_dead_letters_whole_chunk_without_splitting(tmp_path):
+    backend = FakeBackend(outage=True)
+    writer = make(backend, tmp_path, chunk_size=10, max_retries=2)
+    failed = writer.write_stage({"movie": rows(1, 2, 3, 4)})
+
+    assert failed == {"movie": rows(1, 2, 3, 4)}
+    assert backend.calls == [("movie", [1, 2, 3, 4])] * 3
+    entries = read_dead_letter(writer.dead_letter_path)
+    assert [entry["row"] for entry in entries] == rows(1, 2, 3, 4)
+    assert all("server closed" in entry["error"] for entry in entries)
+
+
+def test_replay_writes_parents_before_children(tmp_path):
+    writer = make(FakeBackend(outage=True), tmp_path, max_retries=0)
+    writer.dead_letter("movie_actor", rows(10), "parent not written")
+    writer.dead_letter("movie_genre", rows(11), "parent not written")
+    writer.dead_letter("crew_member", rows(12), "outage")
+    writer.dead_letter("movie", rows(13), "outage")
+
+    writer.backend = FakeBackend()
+    assert writer.replay_dead_letter() == 0
+    tables = [table for table, _ in writer.backend.written]
+    assert sorted(tables[:2]) == ["crew_member", "movie"]
+    assert sorted(tables[2:]) == ["movie_actor", "movie_genre"]
+    assert not (tmp_path / "dead_letter.jsonl").exists()
+    assert not (tmp_path / "dead_letter.jsonl.replaying").exists()
+
+
+def test_replay_keeps_rows_that_fail_again(tmp_path):
+    writer = make(FakeBackend(), tmp_path)
+    writer.dead_letter("movie", rows(1, 2, 3), "outage")
+
+    writer.backend = FakeBackend(bad={2})
+    assert writer.replay_dead_letter() == 1
+    assert [entry["row"] for entry in read_dead_letter(writer.dead_letter_path)] == rows(2)
+    assert writer.replay_dead_letter() == 1
+
+
+def test_interrupted_replay_is_finished_first(tmp_path):
+    writer = make(FakeBackend(), tmp_path)
+    writer.dead_letter("movie", rows(1), "outage")
+    (tmp_path / "dead_letter.jsonl").rename(tmp_path / "dead_letter.jsonl.replaying")
+    writer.dead_letter("movie", rows(2), "outage")
+
+    assert writer.replay_dead_letter() == 0
+    assert writer.backend.written == [("movie", [1])]
+    # rows dead-lettered since the interrupted replay wait for the next one
+    assert [entry["row"] for entry in read_dead_letter(writer.dead_letter_path)] == rows(2)
+    assert writer.replay_dead_letter() == 0
+    assert writer.backend.written == [("movie", [1]), ("movie", [2])]
+
+
+def test_is_data_error():
+    class HTTPError(Exception):
+        def __init__(self, status):
+            self.response = type("Response", (), {"status_code": status})()
+
+    assert bulk_writer.is_data_error(ConstraintError())
+    assert bulk_writer.is_data_error(HTTPError(409))
+    assert not bulk_writer.is_data_error(HTTPError(503))
+    assert not bulk_writer.is_data_error(ConnectionLost())
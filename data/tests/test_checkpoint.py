@@ -0,0 +1,117 @@
+import sys
+import types
+import pickle
+import pytest
+from checkpoint import CheckpointStore
+
+try:
+    import supabase  # noqa: F401
+except ImportError:
+    # imports.py only needs create_client once init() runs, which these tests never call
+    sys.modules["supabase"] = types.SimpleNamespace(create_client=None, Client=None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoint.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def imports(tmp_path, monkeypatch, store):
+    monkeypatch.chdir(tmp_path)  # the importer logs and looks for progress.pkl in the working directory
+    import imports
+    monkeypatch.setattr(imports, "checkpoint", store)
+    return imports
+
+
+@pytest.fixture
+def discover(imports, monkeypatch):
+    # a catalogue with one page of movies in 2000, and an importer that fails the ids in `failing`
+    state = types.SimpleNamespace(imported=[], failing=set())
+
+    def tmdb_get(path, params):
+        if params["primary_release_year"] == 2000 and params["page"] == 1:
+            return {"results": [{"id": 1}, {"id": 2}, {"id": 3}]}
+        return {"results": []}
+
+    def import_movies(movie_ids, executor, label="Batch"):
+        state.imported.append(list(movie_ids))
+        failed = [movie_id for movie_id in movie_ids if movie_id in state.failing]
+        imports.checkpoint.mark_movies_done(m for m in movie_ids if m not in failed)
+        return failed
+
+    monkeypatch.setattr(imports, "tmdb_get", tmdb_get)
+    monkeypatch.setattr(imports, "import_movies", import_movies)
+    imports.save_cursor(2000, 1)
+    return state
+
+
+def test_state_is_written_together_and_survives_reopen(tmp_path, store):
+    store.set_many({"discover_year": 1999, "discover_page": 2})
+    store.mark_movies_done([1, 2])
+    store.mark_people_done([7])
+    store.close()
+
+    reopened = CheckpointStore(str(tmp_path / "checkpoint.db"))
+    assert reopened.get("discover_year") == "1999" and reopened.get("discover_page") == "2"
+    assert reopened.get("missing", "default") == "default"
+    assert reopened.done_movies([1, 2, 3]) == {1, 2}
+    assert reopened.has_person(7) and not reopened.has_person(8)
+    reopened.close()
+
+
+def test_done_lookups_span_query_chunks(store):
+    store.mark_movies_done(range(0, 2000, 2))
+    assert store.done_movies(range(2000)) == set(range(0, 2000, 2))
+
+
+def test_movie_retries_count_attempts(store):
+    store.add_movie_retries([5, 6])
+    store.add_movie_retries([6])
+    assert store.movie_retries(2) == [5]
+    assert store.movie_retries(3) == [5, 6]
+    store.clear_movie_retries([5])
+    assert store.movie_retries(3) == [6]
+
+
+def test_cursor_round_trip(imports):
+    imports.save_cursor(1987, 2)
+    assert imports.load_cursor() == (1987, 2)
+
+
+def test_legacy_progress_file_is_read_once_checkpoint_is_empty(imports, tmp_path):
+    with open(tmp_path / "progress.pkl", "wb") as f:
+        pickle.dump({"year": 1995, "page": 2}, f)
+    assert imports.load_cursor() == (1995, 2)
+
+    imports.save_cursor(1994, 1)
+    assert imports.load_cursor() == (1994, 1)
+
+
+def test_unreadable_legacy_progress_file_starts_over(imports, tmp_path):
+    (tmp_path / "progress.pkl").write_bytes(b"not a pickle")
+    year, page = imports.load_cursor()
+    assert page == 1 and year >= 2024
+
+
+def test_half_finished_page_only_imports_what_is_missing(imports, discover):
+    imports.checkpoint.mark_movies_done([1, 2])
+    imports.run_discover()
+    assert discover.imported == [[3]]
+    assert imports.checkpoint.done_movies([1, 2, 3]) == {1, 2, 3}
+
+
+def test_unfinished_movies_are_retried_on_the_next_run(imports, discover):
+    discover.failing = {2}
+    imports.run_discover()
+    assert discover.imported == [[1, 2, 3]]
+    assert imports.checkpoint.movie_retries(imports.MOVIE_RETRY_ATTEMPTS) == [2]
+
+    discover.failing = set()
+    imports.save_cursor(2000, 1)
+    imports.run_discover()
+    assert discover.imported[1] == [2]  # retried before the crawl, the page itself is already done
+    assert len(discover.imported) == 2
+    assert imports.checkpoint.movie_retries(imports.MOVIE_RETRY_ATTEMPTS) == []
@@ -0,0 +1,135 @@
+import types
+import pytest
+import requests
+import tmdb
+from tmdb import TokenBucket
+
+
+class FakeClock:
+    # monotonic time that only moves when someone sleeps
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # like a real sleep, some time always passes
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-6)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tmdb, "time", types.SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+
+@pytest.fixture
+def upstream(clock, monkeypatch):
+    # session.get answers from a queue of responses, or raises queued exceptions
+    state = types.SimpleNamespace(responses=[], calls=[])
+
+    def get(url, params=None, timeout=None):
+        state.calls.append((clock.now, url, params))
+        response = state.responses.pop(0) if len(state.responses) > 1 else state.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(tmdb, "session", types.SimpleNamespace(get=get))
+    monkeypatch.setattr(tmdb, "rate_limiter", TokenBucket(rate=1000, capacity=1000))
+    return state
+
+
+def test_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.1)]
+
+
+def test_pause_holds_until_the_shared_deadline(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+    bucket.pause(5)
+    clock.now += 2
+    bucket.pause(1)  # a shorter pause from another worker doesn't move the deadline
+    assert bucket.blocked_until == pytest.approx(1005)
+    bucket.acquire()
+    assert clock.now == pytest.approx(1005.1)  # waits out the pause, then one token's worth of refill
+
+
+def test_tokens_only_accrue_after_the_pause(clock):
+    bucket = TokenBucket(rate=8, capacity=3)
+    bucket.pause(5)
+    clock.now += 5.25
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert len(clock.sleeps) == 1
+
+
+def test_429_pauses_every_worker_for_retry_after(clock, upstream):
+    upstream.responses = [FakeResponse(429, {"Retry-After": "3"}), FakeResponse(200, body={"id": 1})]
+    assert tmdb.tmdb_get("/movie/1") == {"id": 1}
+    assert tmdb.rate_limiter.blocked_until == pytest.approx(1003)
+    assert upstream.calls[1][0] == pytest.approx(1003, abs=0.01)
+
+
+def test_retry_after_is_capped(clock, upstream, monkeypatch):
+    monkeypatch.setattr(tmdb, "TMDB_BACKOFF_CAP", 30)
+    upstream.responses = [FakeResponse(429, {"Retry-After": "3600"}), FakeResponse(200, body={})]
+    tmdb.tmdb_get("/movie/1")
+    assert upstream.calls[1][0] == pytest.approx(1030, abs=0.01)
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(tmdb, "TMDB_BACKOFF_CAP", 30)
+    assert all(0 <= tmdb.backoff_delay(attempt) <= 30 for attempt in range(20))
+    assert tmdb.backoff_delay(0, retry_after=7) == 7
+
+
+def test_retry_after_dates_fall_back_to_backoff():
+    res = FakeResponse(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert tmdb.parse_retry_after(res) is None
+    assert tmdb.parse_retry_after(FakeResponse(429, {"Retry-After": "-4"})) == 0
+
+
+def test_retries_stop_at_max_retries(clock, upstream, monkeypatch):
+    monkeypatch.setattr(tmdb, "TMDB_MAX_RETRIES", 2)
+    upstream.responses = [FakeResponse(503)]
+    with pytest.raises(requests.HTTPError):
+        tmdb.tmdb_get("/movie/1")
+    assert len(upstream.calls) == 3
+
+
+def test_network_errors_stop_at_max_retries(clock, upstream, monkeypatch):
+    monkeypatch.setattr(tmdb, "TMDB_MAX_RETRIES", 2)
+    upstream.responses = [requests.ConnectionError("reset")]
+    with pytest.raises(requests.ConnectionError):
+        tmdb.tmdb_get("/movie/1")
+    assert len(upstream.calls) == 3
+
+
+def test_not_found_is_not_retried(clock, upstream):
+    upstream.responses = [FakeResponse(404)]
+    assert tmdb.tmdb_get("/movie/1") is None
+    assert len(upstream.calls) == 1
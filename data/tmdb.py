@@ -0,0 +1,139 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv() # load env variables from .env file
+
+TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+
+# fetch tuning, all overridable from .env
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))  # sustained requests per second
+TMDB_BURST = int(os.getenv("TMDB_BURST", "40"))  # bucket size
+TMDB_MAX_WORKERS = int(os.getenv("TMDB_MAX_WORKERS", "20"))  # concurrent requests in flight
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "5"))
+TMDB_BACKOFF_BASE = float(os.getenv("TMDB_BACKOFF_BASE", "0.5"))  # seconds
+TMDB_BACKOFF_CAP = float(os.getenv("TMDB_BACKOFF_CAP", "30"))  # seconds
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", "5"))
+TMDB_READ_TIMEOUT = float(os.getenv("TMDB_READ_TIMEOUT", "20"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    # thread-safe token bucket, acquire() blocks until a token is available
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    # tokens only accrue from the end of a pause
+                    self.tokens = min(self.capacity, self.tokens + (now - max(self.updated, self.blocked_until)) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # hold every worker until the deadline, e.g. after a 429; overlapping pauses don't stack
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.tokens, 0)
+            self.updated = now
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+def make_session(pool_size):
+    # one keep-alive pool shared by every worker thread
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+session = make_session(TMDB_MAX_WORKERS)
+rate_limiter = TokenBucket(TMDB_RATE_LIMIT, TMDB_BURST)
+
+# running total of HTTP requests sent, including retries
+request_count = 0
+request_count_lock = threading.Lock()
+
+
+def get_request_count():
+    return request_count
+
+
+def backoff_delay(attempt, retry_after=None):
+    # capped exponential backoff with full jitter, server hint wins when present
+    if retry_after is not None:
+        return min(TMDB_BACKOFF_CAP, retry_after)
+    return random.uniform(0, min(TMDB_BACKOFF_CAP, TMDB_BACKOFF_BASE * (2 ** attempt)))
+
+
+def parse_retry_after(res):
+    value = res.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def tmdb_get(path, params=None):
+    # GET a TMDB endpoint, returns parsed json or None for non-retryable failures (e.g. 404)
+    # raises the last error once retries are exhausted
+    global request_count
+    url = path if path.startswith("http") else f"{TMDB_BASE_URL}{path}"
+    query = {"api_key": TMDB_API_KEY}
+    if params:
+        query.update(params)
+
+    for attempt in range(TMDB_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        with request_count_lock:
+            request_count += 1
+        try:
+            res = session.get(url, params=query, timeout=(TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == TMDB_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"TMDB {path} network error, retrying in {delay:.2f}s ({e})")
+            time.sleep(delay)
+            continue
+
+        if res.status_code == 200:
+            return res.json()
+        if res.status_code not in RETRYABLE_STATUSES:
+            logging.error(f"TMDB {path} returned {res.status_code}")
+            return None
+        if attempt == TMDB_MAX_RETRIES:
+            res.raise_for_status()
+
+        retry_after = parse_retry_after(res)
+        delay = backoff_delay(attempt, retry_after)
+        logging.warning(f"TMDB {path} returned {res.status_code}, retrying in {delay:.2f}s")
+        if res.status_code == 429:
+            # the shared pause holds this worker too, in the next acquire()
+            rate_limiter.pause(delay)
+        else:
+            time.sleep(delay)
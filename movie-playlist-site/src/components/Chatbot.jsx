@@ -1,7 +1,6 @@
 import React, { useState, useEffect } from "react";
-import axios from "axios";
 import ReactMarkdown from "react-markdown";
-import { playlistsService, moviesService, customUserMovieService } from "../services/databaseSupabase";
+import { CHAT_API_URL, chatAuthHeaders } from "../services/chatService";
 
 const ANIMATION_DURATION = 350; // ms
 
@@ -25,7 +24,6 @@ const Chatbot = () => {
   const [open, setOpen] = useState(false);
   const [isClosing, setIsClosing] = useState(false);
   const [isOpening, setIsOpening] = useState(false);
-  const [userContext, setUserContext] = useState(null);
 
   useEffect(() => {
     if (open) {
@@ -35,117 +33,47 @@ const Chatbot = () => {
     }
   }, [open]);
 
-  // Fetch user info, playlists, watched movies, most watched genre, and recommended movies on mount
-  useEffect(() => {
-    async function fetchUserContext() {
-      try {
-        console.log("Fetching user context...");
-        const user = await moviesService.getUser();
-        console.log("User fetched:", user);
-        
-        const playlists = await playlistsService.getUserPlaylists(user.id);
-        console.log("Playlists fetched:", playlists.length);
-        
-        const watched = await moviesService.getUserWatchedMovies(user.id);
-        console.log("Watched movies fetched:", watched.length);
-        
-        const mostWatchedGenre = await customUserMovieService.getUserMostWatchedGenre(user.id);
-        console.log("Most watched genre ID:", mostWatchedGenre);
-        
-        const mostWatchedActor = await customUserMovieService.getUserMostWatchedActor(user.id);
-        console.log("Most watched actor ID:", mostWatchedActor);
-
-        const mostWatchedGenreName = mostWatchedGenre
-            ? await customUserMovieService.getGenre(mostWatchedGenre)
-            : null;
-        console.log("Most watched genre name:", mostWatchedGenreName);
-        
-        const mostWatchedActorName = mostWatchedActor
-            ? await customUserMovieService.getActor(mostWatchedActor)
-            : null;
-        console.log("Most watched actor name:", mostWatchedActorName);
-            
-        let recommended = [];
-        if (mostWatchedGenre || mostWatchedActor) {
-          recommended = await customUserMovieService.getRecommendedMoviesForUser(user.id, mostWatchedGenre, mostWatchedActor, 5);
-          console.log("Recommendations fetched:", recommended.length);
-        }
-        
-        setUserContext({ 
-          user, 
-          playlists, 
-          watched, 
-          mostWatchedGenre: mostWatchedGenreName, 
-          mostWatchedActor: mostWatchedActorName, 
-          recommended 
-        });
-        console.log("User context set successfully");
-      } catch (err) {
-        console.error("Error fetching user context:", err);
-        setUserContext(null);
-      }
-    }
-    fetchUserContext();
-  }, []);
-
-  // Build context string for the system prompt
-  const buildContextPrompt = (ctx) => {
-    if (!ctx) return "";
-    const { user, playlists, watched, mostWatchedGenre, mostWatchedActor, recommended } = ctx;
-    const playlistNames = playlists?.map(p => p.name).join(", ") || "none";
-    const watchedTitles = watched?.map(w => w.movie?.title).filter(Boolean).join(", ") || "none";
-    const recommendedTitles = recommended?.map(m => m.title).join(", ") || "none";
-    const age = user?.date_of_birth ? Math.floor((new Date() - new Date(user.date_of_birth)) / (365.25 * 24 * 60 * 60 * 1000)) : "N/A";
-    const dob = user?.date_of_birth || "N/A";
-    const bio = user?.bio || "No bio provided.";
-    const username = user?.username || "Unknown";
-    const name = user?.name || "Unknown";
-    console.log("Building context prompt with user data");
-    return `
-    User info: username: ${username}, name: ${name}, age: ${age}, date of birth: ${dob}\n
-    Bio: ${bio}\n
-    Playlists: ${playlistNames}\n
-    Watched movies: ${watchedTitles}\n
-    Most watched genre: ${mostWatchedGenre || "Not enough data"}\n
-    Most watched actor: ${mostWatchedActor || "Not enough data"}\n
-    Recommended movies (based on your favorite genre and actor): ${recommendedTitles}`;
-  };
-
   const sendMessage = async () => {
     if (!input.trim()) return;
-    // Insert user context as a system message after the main system prompt
-    let contextMsg = null;
-    if (userContext) {
-      contextMsg = {
-        role: "system",
-        content: buildContextPrompt(userContext)
-      };
-    }
-    const baseSystemMsg = messages[0];
-    const rest = messages.slice(1).filter(m => m.role !== "system"); // Filter out previous system messages
-    const newMessages = [
-      baseSystemMsg,
-      ...(contextMsg ? [contextMsg] : []),
-      ...rest,
-      { role: "user", content: input }
-    ];
-    if (contextMsg) {
-      console.log("Injected user context for bot:", contextMsg.content);
-    } else {
-      console.log("No user context available");
-    }
-    setMessages([...messages, { role: "user", content: input }]);
+    // The proxy adds the user's context (bio, playlists, watched, recommendations) and trims the history
+    const newMessages = [...messages, { role: "user", content: input }];
+    setMessages(newMessages);
     setInput("");
     setLoading(true);
 
     try {
-      const res = await axios.post("http://localhost:5003/api/chat", {
-        messages: newMessages
+      // Stream the reply so tokens show up as soon as the model produces them
+      const res = await fetch(`${CHAT_API_URL}/api/chat`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", ...(await chatAuthHeaders()) },
+        body: JSON.stringify({ messages: newMessages, stream: true, with_context: true })
       });
-      const botMessage = res.data.choices[0].message;
-      setMessages([...messages, { role: "user", content: input }, botMessage]);
+      if (!res.ok) {
+        const body = await res.json().catch(() => ({}));
+        throw new Error(body.error || res.statusText);
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let reply = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const event of events) {
+          const data = event.replace(/^data: /, "");
+          if (data === "[DONE]") continue;
+          const chunk = JSON.parse(data);
+          if (chunk.error) throw new Error(chunk.error);
+          reply += chunk.choices?.[0]?.delta?.content || "";
+          setLoading(false);
+          setMessages([...newMessages, { role: "assistant", content: reply }]);
+        }
+      }
     } catch (err) {
-      alert("Error: " + (err.response?.data?.error || err.message));
+      alert("Error: " + err.message);
     }
     setLoading(false);
   };
@@ -1,6 +1,8 @@
 import React, { createContext, useState, useContext, useEffect, useCallback, useRef } from 'react';
 import { playlistsService, watchedMoviesService, usersService, friendsService } from '../services/databaseSupabase';
 import { supabase } from '../services/supabaseClient';
+import { invalidateChatContext } from '../services/chatService';
+import { recommendationsService } from '../services/recommendationsService';
 
 export const UserContext = createContext();
 
@@ -386,6 +388,7 @@ export const UserProvider = ({ children }) => {
         .single();
 
       if (error) return { success: false, message: error.message };
+      invalidateChatContext();
       // Optionally update password
       if (updates.password) {
         const { error: pwError } = await supabase.auth.updateUser({ password: updates.password });
@@ -605,9 +608,20 @@ export const UserProvider = ({ children }) => {
       .slice(0, 6); // Limit to 6 recommendations
   };
   
-  // Get personalized movie recommendations based on user's taste profile
-  const getPersonalizedRecommendations = () => {
+  // Get personalized movie recommendations, scored on the backend when it is reachable
+  const getPersonalizedRecommendations = async () => {
     if (!currentUser) return [];
+    try {
+      const recs = await recommendationsService.getPersonalRecommendations(8);
+      if (recs.length) return recs;
+    } catch (err) {
+      console.error('Backend recommendations unavailable, scoring in the browser:', err);
+    }
+    return getLocalRecommendations();
+  };
+
+  // Fallback: score other users' playlist movies against the user's taste profile
+  const getLocalRecommendations = () => {
     
     // Get the user's taste profile
     const tasteProfile = calculateUserTasteProfile();
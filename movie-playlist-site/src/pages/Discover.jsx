@@ -3,6 +3,7 @@ import { genresService, moviesService } from "../services/databaseSupabase";
 import MovieCard from "../components/MovieCard";
 import { useTheme } from "../contexts/ThemeContext";
 import Chatbot from '../components/Chatbot';
+import { completeMovieTitles } from '../services/searchService';
 
 import "./Discover.css";
 
@@ -13,6 +14,7 @@ const Discover = () => {
   const [genres, setGenres] = useState([]);
   const [selectedGenres, setSelectedGenres] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
   
   // Search filter states
   const [yearFilter, setYearFilter] = useState("");
@@ -51,6 +53,22 @@ const Discover = () => {
     loadInitialMovies();
   }, []);
 
+  useEffect(() => {
+    // Title suggestions from the backend index, debounced while typing
+    if (query.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        setSuggestions(await completeMovieTitles(query));
+      } catch (error) {
+        setSuggestions([]);
+      }
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [query]);
+
   const handleSearch = async (e) => {
     e.preventDefault();
     setIsLoading(true);
@@ -143,7 +161,14 @@ const Discover = () => {
                   placeholder="Search movies..."
                   value={query}
                   onChange={(e) => setQuery(e.target.value)}
+                  list="movie-query-suggestions"
+                  autoComplete="off"
                 />
+                <datalist id="movie-query-suggestions">
+                  {suggestions.map(suggestion => (
+                    <option key={suggestion.id} value={suggestion.name} />
+                  ))}
+                </datalist>
               </div>
               
               <div className="search-field">
@@ -4,6 +4,7 @@ import MovieCard from '../components/MovieCard';
 import Chatbot from '../components/Chatbot';
 import { useTheme } from '../contexts/ThemeContext';
 import { moviesService as supabaseService } from '../services/databaseSupabase';
+import { getHomeRails } from '../services/homeService';
 import { useUser } from '../contexts/UserContext';
 import PlaylistDropdown from '../components/PlaylistDropdown';
 
@@ -11,7 +12,7 @@ import './Home.css';
 
 const Home = () => {
   const { themeColors } = useTheme();
-  const { currentUser, addToDefaultPlaylist, addToWatched } = useUser();
+  const { currentUser, addToDefaultPlaylist, addToWatched, getPersonalizedRecommendations } = useUser();
   const navigate = useNavigate();
   
   const [animatedMovies, setAnimatedMovies] = useState([]);
@@ -38,8 +39,20 @@ const Home = () => {
         setIsLoading(true);
         setError(null);
         
-        console.log("Home component: Starting to fetch movies from TMDB...");
-        
+        // One precomputed document from the backend; fall back to querying each rail directly
+        try {
+          const rails = await getHomeRails();
+          setHeroMovies(rails.hero.slice(0, 6));
+          setAnimatedMovies(rails.genres.animated);
+          setHorrorMovies(rails.genres.horror);
+          setPopularMovies(rails.popular);
+          setUpcomingMovies(rails.upcoming);
+          setIsLoading(false);
+          return;
+        } catch (err) {
+          console.error('Home rails unavailable, loading rails individually:', err);
+        }
+
         // Fetch different movie categories
         const animated = await supabaseService.getAnimatedMovies();
         // console.log(`Fetched ${nowPlaying?.length || 0} now playing movies`);
@@ -80,6 +93,20 @@ const Home = () => {
     loadMovies();
   }, []);
 
+  // Personal rail, scored on the backend with the browser as a fallback
+  useEffect(() => {
+    if (!currentUser?.id) {
+      setRecommendedMovies([]);
+      return;
+    }
+    let cancelled = false;
+    getPersonalizedRecommendations()
+      .then(recs => { if (!cancelled) setRecommendedMovies(recs); })
+      .catch(err => console.error('Failed to load recommendations:', err));
+    return () => { cancelled = true; };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentUser?.id]);
+
   // Set up automatic slider
   useEffect(() => {
     if (heroMovies.length > 0) {
@@ -287,6 +314,24 @@ const Home = () => {
           </div>
         ) : (
           <>
+            {/* Recommended Section */}
+            {recommendedMovies.length > 0 && (
+              <div className="movie-section">
+                <h2 className="section-title" style={titleStyle}>Recommended for You ✨</h2>
+                <div className="movie-row">
+                  {recommendedMovies.map((movie) => (
+                    <div className="movie-card-container" key={movie.movie_id || movie.id}>
+                      <MovieCard
+                        movie={movie}
+                        showAddToPlaylist
+                        onAddToPlaylist={handleAddToPlaylist}
+                      />
+                    </div>
+                  ))}
+                </div>
+              </div>
+            )}
+
             {/* Fan Favorites Section */}
             <div className="movie-section">
               <h2 className="section-title" style={titleStyle}>Fan Favorites ❤️</h2>
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { useUser } from '../contexts/UserContext';
 import { useTheme } from '../contexts/ThemeContext';
+import { recommendationsService } from '../services/recommendationsService';
 import './Social.css';
 
 const Social = () => {
@@ -50,9 +51,10 @@ const Social = () => {
       commonGenresList.sort((a, b) => b.averageScore - a.averageScore);
       setCommonGenres(commonGenresList.slice(0, 5)); // Top 5 common genres
       
-      // Get movie recommendations based on shared taste
-      const recs = getSharedTasteRecommendations(selectedFriend.id);
-      setRecommendations(recs);
+      // Get movie recommendations based on shared taste, scored on the backend when it is reachable
+      recommendationsService.getFriendRecommendations(selectedFriend.id)
+        .then(recs => setRecommendations(recs.length ? recs : getSharedTasteRecommendations(selectedFriend.id)))
+        .catch(() => setRecommendations(getSharedTasteRecommendations(selectedFriend.id)));
     }
   }, [selectedFriend, calculateUserTasteProfile, getSharedTasteRecommendations]);
 
@@ -0,0 +1,22 @@
+import { supabase } from './supabaseClient';
+
+export const CHAT_API_URL = "http://localhost:5003";
+
+// The chat proxy identifies the user from their Supabase access token
+export async function chatAuthHeaders() {
+  const { data } = await supabase.auth.getSession();
+  const token = data?.session?.access_token;
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
+// Drop the proxy's cached chatbot context after the user's history changes
+export async function invalidateChatContext() {
+  try {
+    await fetch(`${CHAT_API_URL}/api/context/invalidate`, {
+      method: "POST",
+      headers: await chatAuthHeaders()
+    });
+  } catch (err) {
+    console.error("Error invalidating chat context:", err);
+  }
+}
@@ -1,5 +1,8 @@
 import { supabase } from './supabaseClient';
 import { fetchMovieBackdrop } from './tmdbService';
+import { invalidateChatContext } from './chatService';
+import { recommendationsService } from './recommendationsService';
+import { searchMovieIndex } from './searchService';
 
 // --- USERS SERVICE ---
 export const usersService = {
@@ -35,6 +38,7 @@ export const usersService = {
       .select()
       .single();
     if (error) throw error;
+    invalidateChatContext();
     return data;
   }
 };
@@ -377,6 +381,21 @@ export const moviesService = {
   // Search movies by title
   async searchMovies(query, filters) {
     if (query) {
+      // The backend index applies the filters itself, only the matching rows are fetched
+      try {
+        const hits = await searchMovieIndex(query, filters || {});
+        if (hits.length === 0) return [];
+        const ids = hits.map(hit => hit.id);
+        const { data, error } = await supabase
+          .from('movie')
+          .select('*, movie_genre(genre_id)')
+          .in('movie_id', ids);
+        if (error) throw error;
+        const byId = new Map(data.map(movie => [movie.movie_id, movie]));
+        return ids.map(id => byId.get(id)).filter(Boolean);
+      } catch (err) {
+        console.error('Search index unavailable, using fuzzy_movie_search:', err);
+      }
       console.log(query);
       // Use the fuzzy search RPC for typo-tolerant search
       const { data, error } = await supabase
@@ -546,6 +565,7 @@ export const playlistsService = {
       .single();
     
     if (error) throw error;
+    invalidateChatContext();
     return data;
   },
 
@@ -628,6 +648,7 @@ export const playlistsService = {
       .single();
     
     if (error) throw error;
+    invalidateChatContext();
     return data;
   },
 
@@ -659,6 +680,7 @@ export const playlistsService = {
       .eq('playlist_id', playlistId);
     
     if (error) throw error;
+    invalidateChatContext();
   },
 
   // Add a movie to a playlist
@@ -730,6 +752,8 @@ export const watchedMoviesService = {
       .from('watched_movies')
       .upsert([{ user_id: userId, movie_id: movieId, watch_date: new Date().toISOString() }]);
     if (error) throw error;
+    invalidateChatContext();
+    recommendationsService.recordWatched(movieId);
   },
 
   // Remove a movie from watched
@@ -739,6 +763,7 @@ export const watchedMoviesService = {
       .delete()
       .match({ user_id: userId, movie_id: movieId });
     if (error) throw error;
+    invalidateChatContext();
   },
 
   // Get all watched movies for a user (movie_id, watch_date)
@@ -0,0 +1,8 @@
+import { CHAT_API_URL } from './chatService';
+
+// All home page rails in one request; "no-cache" lets the browser revalidate with the ETag
+export async function getHomeRails() {
+  const res = await fetch(`${CHAT_API_URL}/api/home`, { cache: "no-cache" });
+  if (!res.ok) throw new Error(`Home rails request failed: ${res.status}`);
+  return res.json();
+}
@@ -0,0 +1,32 @@
+import { CHAT_API_URL, chatAuthHeaders } from './chatService';
+
+async function getJson(path) {
+  const res = await fetch(`${CHAT_API_URL}${path}`, { headers: await chatAuthHeaders() });
+  if (!res.ok) throw new Error(`Recommendations request failed: ${res.status}`);
+  return res.json();
+}
+
+export const recommendationsService = {
+  // Top movies for the signed-in user, scored on the backend
+  async getPersonalRecommendations(limit = 8) {
+    return getJson(`/api/recommendations?n=${limit}`);
+  },
+
+  // Movies from a friend's history that match the signed-in user's taste
+  async getFriendRecommendations(friendId, limit = 6) {
+    return getJson(`/api/recommendations/friend/${friendId}?n=${limit}`);
+  },
+
+  // Let the backend fold a new watch into the user's recommendations right away
+  async recordWatched(movieId) {
+    try {
+      await fetch(`${CHAT_API_URL}/api/recommendations/watched`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", ...(await chatAuthHeaders()) },
+        body: JSON.stringify({ movie_id: movieId })
+      });
+    } catch (err) {
+      console.error("Error recording watched movie:", err);
+    }
+  }
+};
@@ -0,0 +1,23 @@
+import { CHAT_API_URL } from './chatService';
+
+async function getJson(path, params) {
+  const res = await fetch(`${CHAT_API_URL}${path}?${params}`);
+  if (!res.ok) throw new Error(`Search request failed: ${res.status}`);
+  return res.json();
+}
+
+// Typo-tolerant movie search on the backend index; genre, year and rating are filtered there
+export async function searchMovieIndex(query, filters = {}, limit = 40) {
+  const params = new URLSearchParams({ q: query, kind: "movie", limit: String(limit) });
+  const year = filters.year || filters.release_year;
+  const minRating = filters.vote_avg ? String(filters.vote_avg).split(',')[0] : filters["vote_avg.gte"];
+  if (filters.genres && filters.genres.length > 0) params.set("genres", filters.genres.join(','));
+  if (year) params.set("year", year);
+  if (minRating) params.set("min_rating", minRating);
+  return getJson('/api/search', params);
+}
+
+// Title suggestions while the user types
+export async function completeMovieTitles(prefix, limit = 8) {
+  return getJson('/api/search/complete', new URLSearchParams({ q: prefix, kind: "movie", limit: String(limit) }));
+}